@@ -3,8 +3,504 @@ import os
 import cv2
 import numpy as np
 import json
+import time
+import zlib
+import struct
+import argparse
+from PIL import Image
+from scipy import ndimage
+from skimage import measure
 
-def create_flood_fill_assets(image_path, output_folder, num_clusters=16):
+# Default folders, relative to this script so it can be run from anywhere
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+INPUT_DIR = os.path.join(SCRIPT_DIR, "input")
+OUTPUT_DIR = os.path.join(SCRIPT_DIR, "output")
+
+# Clustering modes: "full" runs cv2.kmeans on every pixel (10 attempts), "sample" fits on a
+# random pixel sample, "minibatch" refines the centers with small random batches.
+# Both fast modes then assign every pixel to its nearest center in one vectorized pass.
+CLUSTERING_MODES = ("full", "sample", "minibatch")
+SAMPLE_SIZE = 50000
+MINIBATCH_SIZE = 2048
+MINIBATCH_ITERATIONS = 200
+# Pixels per chunk in the nearest-center pass (bounds the temporary distance matrix)
+ASSIGN_CHUNK_SIZE = 1 << 18
+# Fixed seed so repeated runs produce the same palette
+CLUSTERING_SEED = 0
+# Fitted centers of the last run per page, used by --warm-start
+KMEANS_CACHE_DIR = os.path.join(SCRIPT_DIR, ".venv", "kmeans_centers")
+# Adaptive threshold of the outline: neighbourhood size (odd) and offset from the local mean
+OUTLINE_BLOCK_SIZE = 11
+OUTLINE_OFFSET = 2
+# Tiled mode (--memory-budget): estimated working bytes per pixel of a strip (float32 pixels,
+# labels, threshold, outline and mask rows, PNG filtering) on top of 4 bytes per cluster for the
+# nearest-center distances, and per pixel of the reduced label map used to place the numbers.
+TILE_BYTES_PER_PIXEL = 64
+PREVIEW_BYTES_PER_PIXEL = 40
+# Minimum distance in pixels between two region numbers drawn on the outline
+NUMBER_MIN_SPACING = 25
+# Mask formats: "color" is the BGR k-means color mask (mask_<name>.png); "indexed" writes the
+# region IDs as an 8-bit palette PNG (16-bit grayscale beyond 255 regions); "rle" writes them
+# run-length encoded (mask_<name>.rle). Both ID formats come with a regions_<name>.json sidecar.
+MASK_FORMATS = ("color", "indexed", "rle")
+RLE_MAGIC = b"RGN1"
+# Vector outline (--outline-svg): polygon simplification tolerance in pixels, and smallest
+# traced shape kept (in square pixels), for the line art and for the region boundaries
+SVG_OUTLINE_TOLERANCE = 0.8
+SVG_REGION_TOLERANCE = 1.5
+SVG_MIN_SHAPE_AREA = 4
+
+def assign_labels(pixel_values, centers):
+    """
+    Index of the nearest center for every pixel (squared euclidean distance), computed
+    chunk by chunk as |c|^2 - 2 p.c so no (pixels x clusters x 3) array is materialized.
+    Returns int32 labels shaped (N, 1) like cv2.kmeans, and the mean squared error.
+    """
+    centers = centers.astype(np.float32)
+    center_norms = (centers ** 2).sum(axis=1)
+    labels = np.empty((len(pixel_values), 1), dtype=np.int32)
+    squared_error = 0.0
+    for start in range(0, len(pixel_values), ASSIGN_CHUNK_SIZE):
+        chunk = pixel_values[start:start + ASSIGN_CHUNK_SIZE]
+        distances = center_norms[None, :] - 2.0 * chunk @ centers.T
+        nearest = distances.argmin(axis=1)
+        labels[start:start + len(chunk), 0] = nearest
+        squared_error += float(np.take_along_axis(distances, nearest[:, None], axis=1).sum()
+                               + (chunk.astype(np.float64) ** 2).sum())
+    # |c|^2 - 2 p.c is float32: on exact palette colors the sum can round slightly below zero.
+    return labels, max(0.0, squared_error) / max(1, len(pixel_values))
+
+def _kmeans_on(points, num_clusters, attempts, initial_centers=None):
+    # cv2.kmeans on points, seeded by k-means++ or started from initial_centers; returns (labels, centers).
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 0.2)
+    if initial_centers is not None:
+        initial_labels, _ = assign_labels(points, initial_centers)
+        _, labels, centers = cv2.kmeans(points, num_clusters, initial_labels, criteria, 1, cv2.KMEANS_USE_INITIAL_LABELS)
+    else:
+        cv2.setRNGSeed(CLUSTERING_SEED)
+        _, labels, centers = cv2.kmeans(points, num_clusters, None, criteria, attempts, cv2.KMEANS_PP_CENTERS)
+    return labels, centers
+
+def _minibatch_kmeans(pixel_values, num_clusters, rng, initial_centers=None):
+    # Mini-batch k-means (Sculley 2010): each center moves toward its batch points with a
+    # per-center learning rate of 1 / (points assigned so far).
+    if initial_centers is None:
+        seed_points = pixel_values[rng.choice(len(pixel_values), min(len(pixel_values), 10 * MINIBATCH_SIZE), replace=False)]
+        _, initial_centers = _kmeans_on(seed_points.astype(np.float32), num_clusters, attempts=1)
+    centers = initial_centers.astype(np.float32).copy()
+    counts = np.zeros(num_clusters, dtype=np.float64)
+    for _ in range(MINIBATCH_ITERATIONS):
+        batch = pixel_values[rng.integers(0, len(pixel_values), MINIBATCH_SIZE)].astype(np.float32)
+        nearest, _ = assign_labels(batch, centers)
+        nearest = nearest[:, 0]
+        batch_counts = np.bincount(nearest, minlength=num_clusters)
+        batch_sums = np.zeros_like(centers)
+        np.add.at(batch_sums, nearest, batch)
+        counts += batch_counts
+        moved = batch_counts > 0
+        rates = (batch_counts[moved] / counts[moved]).astype(np.float32)[:, None]
+        centers[moved] += rates * (batch_sums[moved] / batch_counts[moved][:, None] - centers[moved])
+    return centers
+
+def fit_centers(pixel_values, num_clusters, mode, initial_centers=None):
+    """
+    Fit num_clusters color centers with a fast clustering mode ("sample" or "minibatch")
+    without labelling every pixel. pixel_values may be a uint8 view of the page: only the
+    sampled points are converted to float32.
+    """
+    if initial_centers is not None and len(initial_centers) != num_clusters:
+        initial_centers = None
+    rng = np.random.default_rng(CLUSTERING_SEED)
+    if mode == "sample":
+        sample = pixel_values[rng.choice(len(pixel_values), min(len(pixel_values), SAMPLE_SIZE), replace=False)]
+        _, centers = _kmeans_on(sample.astype(np.float32), num_clusters, attempts=3, initial_centers=initial_centers)
+    elif mode == "minibatch":
+        centers = _minibatch_kmeans(pixel_values, num_clusters, rng, initial_centers)
+    else:
+        raise ValueError(f"Unknown clustering mode: {mode}")
+    return centers
+
+def fit_palette(pixel_values, num_clusters, mode="full", initial_centers=None):
+    """
+    Fit num_clusters color centers with the given clustering mode, then label every pixel.
+    initial_centers (from a previous run) replaces the k-means++ seeding with a single
+    refinement started from those centers.
+    Returns (labels (N, 1) int32, centers float32 (k, 3), mean squared color error).
+    """
+    if initial_centers is not None and len(initial_centers) != num_clusters:
+        initial_centers = None
+    if mode == "full":
+        labels, centers = _kmeans_on(pixel_values, num_clusters, attempts=10, initial_centers=initial_centers)
+        error = float(((pixel_values - centers[labels[:, 0]]) ** 2).sum(axis=1).mean())
+        return labels, centers, error
+    centers = fit_centers(pixel_values, num_clusters, mode, initial_centers)
+    labels, error = assign_labels(pixel_values, centers)
+    return labels, centers, error
+
+def palette_distance(centers, reference_centers):
+    """
+    Mean distance (in 0-255 RGB units) from each center to the nearest reference center:
+    how far a fast-mode palette is from the full fit.
+    """
+    distances = np.linalg.norm(centers[:, None, :].astype(np.float32) - reference_centers[None, :, :], axis=2)
+    return float(distances.min(axis=1).mean())
+
+def _load_cached_centers(base_name):
+    try:
+        with open(os.path.join(KMEANS_CACHE_DIR, f"{base_name}.json")) as f:
+            return np.array(json.load(f)["centers"], dtype=np.float32)
+    except (OSError, ValueError, KeyError):
+        return None
+
+def _save_cached_centers(base_name, centers):
+    os.makedirs(KMEANS_CACHE_DIR, exist_ok=True)
+    with open(os.path.join(KMEANS_CACHE_DIR, f"{base_name}.json"), "w") as f:
+        json.dump({"centers": centers.tolist()}, f)
+
+def colorable_clusters(centers, counts):
+    """
+    Boolean per cluster: False for clusters that are not offered for coloring (the dominant
+    cluster when it is near white, and any very dark or very white cluster) or absent from the page.
+    """
+    brightness = centers.astype(np.float32).mean(axis=1)
+    excluded = (brightness < 35) | (brightness > 235)
+    background_candidate_label = np.argmax(counts)
+    excluded[background_candidate_label] |= brightness[background_candidate_label] > 230
+    return ~excluded & (counts > 0)
+
+def remap_colors(labels_map, color_lut):
+    """
+    Color image from a cluster map and a (k, 3) color table, in one lookup-table pass
+    (cv2.LUT on the 8-bit label map, or np.take beyond 256 clusters).
+    """
+    if len(color_lut) > 256:
+        return np.take(color_lut, labels_map, axis=0)
+    labels_8bit = labels_map.astype(np.uint8)
+    table = np.zeros((256, 1, 3), dtype=np.uint8)
+    table[:len(color_lut), 0] = color_lut
+    return cv2.LUT(cv2.merge([labels_8bit, labels_8bit, labels_8bit]), table)
+
+def largest_cluster_regions(labels_map, num_clusters):
+    """
+    Single labelling pass over the cluster map (8-connectivity): every connected patch of one
+    cluster becomes a region and all region areas come from one bincount. The largest region
+    of each cluster is then remapped through a lookup table to a small label image, from which
+    area, centroid and bounding box of those regions are measured together.
+    Returns (region map, {cluster: {"region", "area", "centroid": (x, y), "bbox": (slice_y, slice_x)}})
+    describing the largest region of each cluster present on the page.
+    """
+    regions, count = measure.label(labels_map, background=-1, connectivity=2, return_num=True)
+    flat = regions.ravel()
+    areas = np.bincount(flat, minlength=count + 1)
+    cluster_of_region = np.zeros(count + 1, dtype=np.int64)
+    cluster_of_region[flat] = labels_map.ravel()
+
+    # Regions sorted by cluster, then by decreasing area: the first of each cluster is its largest.
+    region_ids = np.arange(1, count + 1)
+    order = region_ids[np.lexsort((-areas[1:], cluster_of_region[1:]))]
+    clusters, first = np.unique(cluster_of_region[order], return_index=True)
+    selected = order[first]
+
+    # Lookup table region -> 1..len(selected) (0 elsewhere): one remap isolates the chosen regions.
+    selection_lut = np.zeros(count + 1, dtype=np.int32)
+    selection_lut[selected] = np.arange(1, len(selected) + 1)
+    chosen = selection_lut[regions]
+    boxes = ndimage.find_objects(chosen)
+    indices = np.flatnonzero(chosen)
+    chosen_ids = chosen.ravel()[indices]
+    sum_x = np.bincount(chosen_ids, weights=indices % labels_map.shape[1], minlength=len(selected) + 1)
+    sum_y = np.bincount(chosen_ids, weights=indices // labels_map.shape[1], minlength=len(selected) + 1)
+
+    largest = {}
+    for i, (cluster, region) in enumerate(zip(clusters, selected), start=1):
+        largest[int(cluster)] = {
+            "region": int(region),
+            "area": int(areas[region]),
+            "centroid": (sum_x[i] / areas[region], sum_y[i] / areas[region]),
+            "bbox": boxes[i - 1],
+        }
+    return regions, largest
+
+class PlacementGrid:
+    """
+    Grid-bucket spatial index of placed number anchors. Cells are min_distance wide, so any
+    anchor closer than min_distance to a point lies in the point's cell or one of its 8
+    neighbours: a collision test looks at those 9 buckets instead of every placed anchor.
+    """
+
+    def __init__(self, min_distance):
+        self.min_distance = min_distance
+        self._cells = {}
+
+    def _cell(self, x, y):
+        return int(x // self.min_distance), int(y // self.min_distance)
+
+    def can_place(self, x, y):
+        cell_x, cell_y = self._cell(x, y)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for px, py in self._cells.get((cell_x + dx, cell_y + dy), ()):
+                    if np.hypot(x - px, y - py) < self.min_distance:
+                        return False
+        return True
+
+    def add(self, x, y):
+        self._cells.setdefault(self._cell(x, y), []).append((x, y))
+
+def region_anchor(regions, region_id, bbox):
+    """
+    Label position inside a region: the pixel farthest from the region's border (maximum of
+    the distance transform over the region's bounding box). Unlike the centroid, it always
+    lies inside the region, even for concave or ring-shaped regions.
+    Returns ((x, y), clearance in pixels).
+    """
+    slice_y, slice_x = bbox
+    # One pixel of padding so the bounding box edge also counts as a border.
+    inside = np.pad((regions[bbox] == region_id).astype(np.uint8), 1)
+    distances = cv2.distanceTransform(inside, cv2.DIST_L2, 5)
+    y, x = np.unravel_index(np.argmax(distances), distances.shape)
+    return (int(x) - 1 + slice_x.start, int(y) - 1 + slice_y.start), float(distances[y, x])
+
+def place_region_numbers(labels_map, centers, colorable, scale=1, page_labels=None, page_points=None):
+    """
+    Number every colorable cluster (1..n, in cluster order) and pick where to draw it: the
+    anchor of its largest patch, skipped when closer than NUMBER_MIN_SPACING to a placed number.
+    labels_map may be the page reduced by scale (one pixel per scale x scale block); anchors
+    are then mapped back to page pixels and, through page_labels(slice_y, slice_x) (full
+    resolution labels of a window), moved to the anchor of the region around them at full
+    resolution, since thin parts of a region can vanish from the reduced map. A whole cluster
+    can vanish too (thin strokes between sampled rows): page_points gives a full-resolution
+    pixel (x, y) of each cluster to start from instead; without one its anchor stays None.
+    Returns (region ID of each cluster, 0 when not colorable, regions sidecar entries,
+    [(x, y, number)] to draw on the outline).
+    """
+    regions, largest_regions = largest_cluster_regions(labels_map, len(centers))
+    placed_numbers = PlacementGrid(NUMBER_MIN_SPACING)
+    region_id_lut = np.zeros(len(centers), dtype=np.int64)
+    region_entries = []
+    numbers = []
+
+    for region_id, label_idx in enumerate(np.flatnonzero(colorable), start=1):
+        # This is a valid, colorable region. Draw its number where its largest patch has the most room.
+        region = largest_regions.get(int(label_idx))
+        if region is not None:
+            (cX, cY), clearance = region_anchor(regions, region["region"], region["bbox"])
+            cX, cY = cX * scale + scale // 2, cY * scale + scale // 2
+            radius = int(scale * (clearance + 1))
+        elif page_points is not None and int(label_idx) in page_points:
+            # Missing from the reduced map: look around one of its full-resolution pixels.
+            cX, cY = page_points[int(label_idx)]
+            radius = scale
+        else:
+            cX = cY = None
+        if cX is not None and scale > 1 and page_labels is not None:
+            window = (slice(max(0, cY - radius), cY + radius + 1), slice(max(0, cX - radius), cX + radius + 1))
+            window_labels = page_labels(*window)
+            (wX, wY), window_clearance = region_anchor(
+                window_labels, label_idx, (slice(0, window_labels.shape[0]), slice(0, window_labels.shape[1])))
+            if window_clearance > 0:
+                cX, cY = wX + window[1].start, wY + window[0].start
+
+        region_id_lut[label_idx] = region_id
+        b, g, r = (int(c) for c in centers[label_idx])
+        region_entries.append({"id": region_id, "number": region_id,
+                               "color": f"#{r:02x}{g:02x}{b:02x}", "anchor": None})
+
+        if cX is not None and placed_numbers.can_place(cX, cY):
+            placed_numbers.add(cX, cY)
+            region_entries[-1]["anchor"] = [cX, cY]
+            numbers.append((cX, cY, region_id))
+    return region_id_lut, region_entries, numbers
+
+def draw_region_number(outline_rgba, cX, cY, number):
+    # Draw number on the transparent outline image (coordinates may fall outside a strip: OpenCV clips)
+    cv2.circle(outline_rgba, (cX, cY), 12, (255, 255, 255, 255), -1) # White, opaque circle
+    text = str(number)
+    font_scale = 0.6
+    thickness = 1
+    (text_w, text_h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+    cv2.putText(outline_rgba, text, (cX - text_w // 2, cY + text_h // 2),
+                cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 0, 255), thickness) # Black, opaque text
+
+class PngStreamWriter:
+    """
+    PNG encoder fed a strip of rows at a time: each strip is filtered ("Up", difference with
+    the row above) and pushed through a single zlib stream, so only the current strip is in
+    memory. Rows are (n, width) gray / palette indices (uint8 or uint16) or (n, width, channels)
+    RGB / RGBA uint8; palette is a (256, 3) RGB table for an indexed PNG.
+    """
+
+    def __init__(self, path, width, height, channels=1, bit_depth=8, palette=None):
+        color_type = 3 if palette is not None else {1: 0, 3: 2, 4: 6}[channels]
+        self._file = open(path, "wb")
+        self._file.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, bit_depth, color_type, 0, 0, 0))
+        if palette is not None:
+            self._chunk(b"PLTE", np.asarray(palette, dtype=np.uint8).tobytes())
+        self._compressor = zlib.compressobj(6)
+        self._previous_row = np.zeros(width * channels * bit_depth // 8, dtype=np.uint8)
+
+    def _chunk(self, tag, data):
+        self._file.write(struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data)))
+
+    def write_rows(self, rows):
+        # PNG stores 16-bit samples big-endian; uint8 subtraction wraps modulo 256 as the Up filter expects.
+        rows = np.ascontiguousarray(rows, dtype=">u2" if rows.dtype == np.uint16 else np.uint8)
+        raw = rows.reshape(len(rows), -1).view(np.uint8)
+        filtered = np.empty((len(raw), raw.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        filtered[0, 1:] = raw[0] - self._previous_row
+        filtered[1:, 1:] = raw[1:] - raw[:-1]
+        self._previous_row = raw[-1].copy()
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+
+    def close(self):
+        self._chunk(b"IDAT", self._compressor.flush())
+        self._chunk(b"IEND", b"")
+        self._file.close()
+
+class RegionRleWriter:
+    """
+    Run-length encoded region-ID map, written strip by strip, row-major, little-endian:
+
+        header : magic "RGN1", u16 bits per ID (8 or 16), u16 reserved, u32 width, u32 height, u32 runs N
+        runs   : N x (ID as u8 / u16, u32 run length)
+
+    Runs continue across row (and strip) ends; the lengths add up to width x height.
+    """
+
+    HEADER = struct.Struct("<4sHHIII")
+
+    def __init__(self, path, width, height, id_bits):
+        self._file = open(path, "wb")
+        self._width, self._height, self._id_bits = width, height, id_bits
+        self._run_dtype = np.dtype([("id", "<u1" if id_bits == 8 else "<u2"), ("length", "<u4")])
+        self._count = 0
+        self._pending = None
+        self._file.write(self.HEADER.pack(RLE_MAGIC, id_bits, 0, width, height, 0))
+
+    def write_rows(self, region_ids):
+        flat = region_ids.ravel()
+        starts = np.concatenate(([0], np.flatnonzero(flat[1:] != flat[:-1]) + 1))
+        runs = np.empty(len(starts), dtype=self._run_dtype)
+        runs["id"] = flat[starts]
+        runs["length"] = np.diff(np.append(starts, flat.size))
+        if self._pending is not None:
+            if self._pending["id"] == runs[0]["id"]:
+                runs[0]["length"] += self._pending["length"]
+            else:
+                self._write_runs(self._pending[None])
+        # The last run may continue in the next strip.
+        self._write_runs(runs[:-1])
+        self._pending = runs[-1].copy()
+
+    def _write_runs(self, runs):
+        self._file.write(runs.tobytes())
+        self._count += len(runs)
+
+    def close(self):
+        if self._pending is not None:
+            self._write_runs(self._pending[None])
+        self._file.seek(0)
+        self._file.write(self.HEADER.pack(RLE_MAGIC, self._id_bits, 0, self._width, self._height, self._count))
+        self._file.close()
+
+def decode_region_rle(data):
+    # Inverse of RegionRleWriter (reference for the app-side reader).
+    magic, id_bits, _, width, height, count = RegionRleWriter.HEADER.unpack_from(data, 0)
+    if magic != RLE_MAGIC:
+        raise ValueError("Not a region RLE file")
+    runs = np.frombuffer(data, dtype=[("id", "<u1" if id_bits == 8 else "<u2"), ("length", "<u4")],
+                         count=count, offset=RegionRleWriter.HEADER.size)
+    return np.repeat(runs["id"], runs["length"]).reshape(height, width)
+
+def region_palette(region_id_lut, centers):
+    # (256, 3) RGB palette of an indexed mask: region colors, white for 0 (not colorable).
+    palette = np.full((256, 3), 255, dtype=np.uint8)
+    for label_idx, region_id in enumerate(region_id_lut):
+        if 0 < region_id < 256:
+            palette[region_id] = centers[label_idx][::-1]
+    return palette
+
+def write_region_mask(region_ids, palette, output_folder, base_name, mask_format):
+    """
+    Write the region-ID map (0 = not colorable, 1..n = region number) in mask_format and
+    return the file name. The palette (see region_palette) keeps the indexed mask
+    previewing like the color mask.
+    """
+    height, width = region_ids.shape
+    id_bits = 8 if region_ids.max(initial=0) <= 255 else 16
+    if mask_format == "rle":
+        filename = f"mask_{base_name}.rle"
+        writer = RegionRleWriter(os.path.join(output_folder, filename), width, height, id_bits)
+        writer.write_rows(region_ids)
+        writer.close()
+        return filename
+
+    filename = f"mask_{base_name}.png"
+    if id_bits == 16:
+        cv2.imwrite(os.path.join(output_folder, filename), region_ids.astype(np.uint16))
+        return filename
+    indexed = Image.fromarray(region_ids.astype(np.uint8), mode="P")
+    indexed.putpalette(palette.ravel().tolist())
+    indexed.save(os.path.join(output_folder, filename), optimize=True)
+    return filename
+
+def write_regions_sidecar(output_folder, base_name, mask_file, mask_format, width, height, region_entries):
+    with open(os.path.join(output_folder, f"regions_{base_name}.json"), "w") as f:
+        json.dump({"mask": mask_file, "format": mask_format, "width": width, "height": height,
+                   "regions": region_entries}, f, indent=4)
+
+def trace_paths(binary_mask, tolerance, min_area=SVG_MIN_SHAPE_AREA):
+    """
+    SVG path data ("M x,y l dx,dy ... z" per contour, integer pixels, relative steps) of the
+    shapes of a binary mask, holes included: meant to be filled with fill-rule="evenodd".
+    Contours are simplified with Douglas-Peucker (tolerance in pixels); shapes smaller than
+    min_area are dropped.
+    """
+    contours, _ = cv2.findContours(binary_mask.astype(np.uint8), cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    commands = []
+    for contour in contours:
+        if cv2.contourArea(contour) < min_area:
+            continue
+        points = cv2.approxPolyDP(contour, tolerance, True)[:, 0]
+        if len(points) < 3:
+            continue
+        steps = np.diff(points, axis=0)
+        commands.append(f"M{points[0][0]},{points[0][1]}l" + " ".join(f"{dx},{dy}" for dx, dy in steps) + "z")
+    return "".join(commands)
+
+def write_outline_svg(path, width, height, binary_outline_inv, labels_map, region_id_lut, region_entries, numbers):
+    """
+    Vector counterpart of the RGBA outline: the line art as filled paths, one (unfilled) path
+    per region ID tracing its boundaries, and the numbers as circle + text elements at their
+    anchors, so the app can render the page at any zoom without holding a bitmap.
+    """
+    colors = {entry["id"]: entry["color"] for entry in region_entries}
+    lines = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+        "<style>.r{fill:none}.n circle{fill:#fff}.n text{font:16px sans-serif;text-anchor:middle;dominant-baseline:central}</style>",
+        '<g id="regions" class="r" fill-rule="evenodd">',
+    ]
+    for label_idx, region_id in enumerate(region_id_lut):
+        data = trace_paths(labels_map == label_idx, SVG_REGION_TOLERANCE) if region_id else ""
+        # Clusters made only of specks smaller than SVG_MIN_SHAPE_AREA have nothing to trace.
+        if data:
+            lines.append(f'<path id="r{region_id}" data-color="{colors[region_id]}" d="{data}"/>')
+    lines.append("</g>")
+    lines.append(f'<path id="outline" fill-rule="evenodd" d="{trace_paths(binary_outline_inv == 255, SVG_OUTLINE_TOLERANCE)}"/>')
+    lines.append('<g id="numbers" class="n">')
+    for cX, cY, number in numbers:
+        lines.append(f'<g data-region="{number}"><circle cx="{cX}" cy="{cY}" r="12"/><text x="{cX}" y="{cY}">{number}</text></g>')
+    lines.append("</g>")
+    lines.append("</svg>")
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+def create_flood_fill_assets(image_path, output_folder, num_clusters=16, clustering="full",
+                             warm_start=False, compare_full=False, mask_format="color", outline_svg=False):
     img = cv2.imread(image_path)
     if img is None:
         print(f"❌ Error reading {image_path}")
@@ -15,7 +511,7 @@ def create_flood_fill_assets(image_path, output_folder, num_clusters=16):
     # --- 1. Create Outline Image (4-channel RGBA with transparent background) ---
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     binary_outline_inv = cv2.adaptiveThreshold(
-        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, OUTLINE_BLOCK_SIZE, OUTLINE_OFFSET
     )
     # Create a 4-channel image, fully transparent
     outline_rgba = np.zeros((h, w, 4), dtype=np.uint8)
@@ -23,85 +519,166 @@ def create_flood_fill_assets(image_path, output_folder, num_clusters=16):
     outline_rgba[binary_outline_inv == 255] = [0, 0, 0, 255]
 
     # --- 2. Create Color Mask (3-channel BGR) using KMeans Segmentation ---
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
     pixel_values = img.reshape((-1, 3)).astype(np.float32)
-    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 0.2)
-    _, labels, centers = cv2.kmeans(
-        pixel_values, num_clusters, None, criteria, 10, cv2.KMEANS_PP_CENTERS
-    )
-    centers = np.uint8(centers)
+    initial_centers = _load_cached_centers(base_name) if warm_start else None
+    start = time.perf_counter()
+    labels, fitted_centers, color_error = fit_palette(pixel_values, num_clusters, clustering, initial_centers)
+    elapsed = time.perf_counter() - start
+    _save_cached_centers(base_name, fitted_centers)
+    report = f"   {base_name}: {clustering} clustering in {elapsed:.2f}s, RMS color error {np.sqrt(color_error):.2f}"
+    if compare_full and clustering != "full":
+        _, full_centers, full_error = fit_palette(pixel_values, num_clusters, "full")
+        report += (f" (full fit {np.sqrt(full_error):.2f}, palette distance to full fit "
+                   f"{palette_distance(fitted_centers, full_centers):.2f})")
+    print(report)
+    centers = np.uint8(fitted_centers)
     labels_reshaped = labels.reshape((h, w))
 
-    # Create a clean mask where each segment is a solid color from the k-means centers
-    segmented_color_mask = centers[labels.flatten()].reshape(img.shape)
-
     # --- 3. Refine: Filter unwanted regions and draw numbers on the outline ---
-    unique_labels, counts = np.unique(labels, return_counts=True)
-    background_candidate_label = unique_labels[np.argmax(counts)]
-    
-    processed_centroids_for_numbers = []
-    current_region_id = 1
-
-    for label_idx in unique_labels:
-        center_color_bgr = centers[label_idx]
-
-        # Skip likely background, very dark, or very white regions
-        if (label_idx == background_candidate_label and np.mean(center_color_bgr) > 230) or \
-           (np.mean(center_color_bgr) < 35) or \
-           (np.mean(center_color_bgr) > 235):
-            # This region is considered non-colorable, so we "erase" it from the mask
-            # by setting its color to pure white, a common background color.
-            segmented_color_mask[labels_reshaped == label_idx] = [255, 255, 255]
-            continue
+    counts = np.bincount(labels.ravel(), minlength=num_clusters)
+    colorable = colorable_clusters(centers, counts)
+
+    # Create a clean mask where each segment is a solid color from the k-means centers.
+    # Non-colorable clusters are "erased" to pure white, a common background color,
+    # through the same lookup table in a single remap.
+    color_lut = centers.copy()
+    color_lut[~colorable] = [255, 255, 255]
+    segmented_color_mask = remap_colors(labels_reshaped, color_lut)
 
-        # This is a valid, colorable region. Find where to draw its number.
-        segment_mask_binary = (labels_reshaped == label_idx).astype(np.uint8)
-        contours, _ = cv2.findContours(segment_mask_binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        if not contours: continue
-
-        valid_contours = [cnt for cnt in contours if cv2.contourArea(cnt) > 20]
-        if not valid_contours: valid_contours = contours
-        
-        largest_contour = max(valid_contours, key=cv2.contourArea)
-        M = cv2.moments(largest_contour)
-        if M["m00"] != 0:
-            cX = int(M["m10"] / M["m00"])
-            cY = int(M["m01"] / M["m00"])
-
-            can_place = True
-            for prev_cx, prev_cy in processed_centroids_for_numbers:
-                if np.hypot(cX - prev_cx, cY - prev_cy) < 25:
-                    can_place = False
-                    break
-            
-            if can_place:
-                processed_centroids_for_numbers.append((cX, cY))
-                # Draw number on the transparent outline image
-                cv2.circle(outline_rgba, (cX, cY), 12, (255, 255, 255, 255), -1) # White, opaque circle
-                text = str(current_region_id)
-                font_scale = 0.6
-                thickness = 1
-                (text_w, text_h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
-                cv2.putText(outline_rgba, text, (cX - text_w // 2, cY + text_h // 2),
-                            cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 0, 255), thickness) # Black, opaque text
-        
-        current_region_id += 1
+    region_id_lut, region_entries, numbers = place_region_numbers(labels_reshaped, centers, colorable)
+    for cX, cY, number in numbers:
+        draw_region_number(outline_rgba, cX, cY, number)
 
     # --- 4. Save the assets ---
-    base_name = os.path.splitext(os.path.basename(image_path))[0]
-    
-    # Save the 3-channel BGR color mask for flood fill
-    cv2.imwrite(os.path.join(output_folder, f"mask_{base_name}.png"), segmented_color_mask)
+    if mask_format == "color":
+        # Save the 3-channel BGR color mask for flood fill
+        cv2.imwrite(os.path.join(output_folder, f"mask_{base_name}.png"), segmented_color_mask)
+    else:
+        # Region-ID mask: a tap maps straight to a region through one pixel read
+        region_ids = np.take(region_id_lut, labels_reshaped)
+        mask_file = write_region_mask(region_ids, region_palette(region_id_lut, centers),
+                                      output_folder, base_name, mask_format)
+        write_regions_sidecar(output_folder, base_name, mask_file, mask_format, w, h, region_entries)
 
     # Save the 4-channel RGBA outline with numbers and transparent background
     cv2.imwrite(os.path.join(output_folder, f"outline_{base_name}.png"), outline_rgba)
+    if outline_svg:
+        write_outline_svg(os.path.join(output_folder, f"outline_{base_name}.svg"), w, h, binary_outline_inv,
+                          labels_reshaped, region_id_lut, region_entries, numbers)
+
+    print(f"✅ {base_name}: {len(region_entries)} colorable regions processed.")
+    return base_name
+
+def _window_labels(img, window, centers):
+    # Nearest-center labels of a window (slice_y, slice_x) of the page, and their summed squared color error.
+    pixels = img[window]
+    labels, error = assign_labels(pixels.reshape((-1, 3)).astype(np.float32), centers)
+    return labels.reshape(pixels.shape[:2]), error * labels.size
+
+def create_flood_fill_assets_tiled(image_path, output_folder, num_clusters=16, clustering="sample",
+                                   warm_start=False, mask_format="color", memory_budget_mb=256):
+    """
+    Memory-bounded create_flood_fill_assets for poster-size pages. The palette is fitted once
+    on a pixel sample ("full" clustering falls back to "sample"), then the page is streamed in
+    horizontal strips sized to memory_budget_mb:
+      - pass 1 labels each strip, counts the clusters and keeps a label map reduced to fit the
+        budget, on which the numbers are placed;
+      - pass 2 labels each strip again, thresholds it (strips overlap by half the threshold
+        block, so the outline is the same as untiled) and streams mask and outline rows to disk.
+    Apart from the decoded source (3 bytes per pixel), memory no longer grows with the page.
+    """
+    img = cv2.imread(image_path)
+    if img is None:
+        print(f"❌ Error reading {image_path}")
+        return None
+
+    h, w = img.shape[:2]
+    budget = memory_budget_mb * 2 ** 20
+    strip_rows = max(1, budget // (w * (TILE_BYTES_PER_PIXEL + 4 * num_clusters)))
+    scale = max(1, int(np.ceil(np.sqrt(h * w * PREVIEW_BYTES_PER_PIXEL / budget))))
+
+    # --- 1. Fit the palette once on a sample of the page ---
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+    mode = "sample" if clustering == "full" else clustering
+    initial_centers = _load_cached_centers(base_name) if warm_start else None
+    start = time.perf_counter()
+    fitted_centers = fit_centers(img.reshape((-1, 3)), num_clusters, mode, initial_centers)
+    _save_cached_centers(base_name, fitted_centers)
+    centers = np.uint8(fitted_centers)
+
+    # --- 2. First pass: cluster counts and reduced label map ---
+    counts = np.zeros(num_clusters, dtype=np.int64)
+    first_pixels = {}
+    squared_error = 0.0
+    preview = np.empty((-(-h // scale), -(-w // scale)), dtype=np.uint8 if num_clusters <= 256 else np.uint16)
+    for y0 in range(0, h, strip_rows):
+        labels, error = _window_labels(img, (slice(y0, y0 + strip_rows), slice(None)), fitted_centers)
+        strip_counts = np.bincount(labels.ravel(), minlength=num_clusters)
+        # First full-resolution pixel of each cluster, for clusters the reduced map may miss.
+        for cluster in np.flatnonzero((strip_counts > 0) & (counts == 0)):
+            y, x = np.unravel_index(np.argmax(labels == cluster), labels.shape)
+            first_pixels[int(cluster)] = (int(x), int(y) + y0)
+        counts += strip_counts
+        squared_error += error
+        # Rows and columns that are multiples of scale make up the reduced map.
+        sampled = labels[(-y0) % scale::scale, ::scale]
+        first_row = -(-y0 // scale)
+        preview[first_row:first_row + len(sampled)] = sampled
+    print(f"   {base_name}: {mode} clustering, {-(-h // strip_rows)} strips of {strip_rows} rows, "
+          f"RMS color error {np.sqrt(squared_error / (h * w)):.2f}")
+
+    colorable = colorable_clusters(centers, counts)
+    region_id_lut, region_entries, numbers = place_region_numbers(
+        preview, centers, colorable, scale, lambda *window: _window_labels(img, window, fitted_centers)[0],
+        first_pixels)
+    del preview
+    color_lut = centers.copy()
+    color_lut[~colorable] = [255, 255, 255]
+
+    # --- 3. Second pass: stream outline and mask rows ---
+    outline_writer = PngStreamWriter(os.path.join(output_folder, f"outline_{base_name}.png"), w, h, channels=4)
+    id_dtype = np.uint8 if region_id_lut.max(initial=0) <= 255 else np.uint16
+    if mask_format == "color":
+        mask_file = f"mask_{base_name}.png"
+        mask_writer = PngStreamWriter(os.path.join(output_folder, mask_file), w, h, channels=3)
+    elif mask_format == "rle":
+        mask_file = f"mask_{base_name}.rle"
+        mask_writer = RegionRleWriter(os.path.join(output_folder, mask_file), w, h, 8 * id_dtype().itemsize)
+    else:
+        mask_file = f"mask_{base_name}.png"
+        mask_writer = PngStreamWriter(os.path.join(output_folder, mask_file), w, h, bit_depth=8 * id_dtype().itemsize,
+                                      palette=region_palette(region_id_lut, centers) if id_dtype == np.uint8 else None)
+
+    overlap = OUTLINE_BLOCK_SIZE // 2
+    for y0 in range(0, h, strip_rows):
+        y1 = min(h, y0 + strip_rows)
+        labels, _ = _window_labels(img, (slice(y0, y1), slice(None)), fitted_centers)
+        top, bottom = max(0, y0 - overlap), min(h, y1 + overlap)
+        binary_outline_inv = cv2.adaptiveThreshold(
+            cv2.cvtColor(img[top:bottom], cv2.COLOR_BGR2GRAY), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY_INV, OUTLINE_BLOCK_SIZE, OUTLINE_OFFSET)[y0 - top:y1 - top]
+        outline_rgba = np.zeros((y1 - y0, w, 4), dtype=np.uint8)
+        outline_rgba[binary_outline_inv == 255] = [0, 0, 0, 255]
+        for cX, cY, number in numbers:
+            draw_region_number(outline_rgba, cX, cY - y0, number)
+        outline_writer.write_rows(outline_rgba[:, :, [2, 1, 0, 3]])
+
+        if mask_format == "color":
+            mask_writer.write_rows(remap_colors(labels, color_lut)[:, :, ::-1])
+        else:
+            mask_writer.write_rows(np.take(region_id_lut, labels).astype(id_dtype))
+    outline_writer.close()
+    mask_writer.close()
+    if mask_format != "color":
+        write_regions_sidecar(output_folder, base_name, mask_file, mask_format, w, h, region_entries)
 
-    print(f"✅ {base_name}: {current_region_id - 1} colorable regions processed.")
+    print(f"✅ {base_name}: {len(region_entries)} colorable regions processed "
+          f"in {time.perf_counter() - start:.2f}s (tiled).")
     return base_name
 
-def main():
-    input_dir = os.path.join(os.path.dirname(__file__), "input")
-    output_dir = os.path.join(os.path.dirname(__file__), "output")
+def main(input_dir=INPUT_DIR, output_dir=OUTPUT_DIR, num_clusters=16, clustering="full",
+         warm_start=False, compare_full=False, mask_format="color", memory_budget_mb=None, outline_svg=False):
     os.makedirs(output_dir, exist_ok=True)
 
     manifest = []
@@ -109,7 +686,12 @@ def main():
     for file in os.listdir(input_dir):
         if file.lower().endswith(('.png', '.jpg', '.jpeg')):
             path = os.path.join(input_dir, file)
-            page_id = create_flood_fill_assets(path, output_dir)
+            if memory_budget_mb:
+                page_id = create_flood_fill_assets_tiled(path, output_dir, num_clusters, clustering,
+                                                         warm_start, mask_format, memory_budget_mb)
+            else:
+                page_id = create_flood_fill_assets(path, output_dir, num_clusters, clustering,
+                                                   warm_start, compare_full, mask_format, outline_svg)
             if page_id:
                 manifest.append(page_id)
 
@@ -120,4 +702,24 @@ def main():
     print(f"\n📄 coloring_manifest.json created with {len(manifest)} pages.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Generate flood-fill masks and numbered outlines for coloring pages.")
+    parser.add_argument("--input", default=INPUT_DIR, help="Folder of source pages (default: input/ next to this script).")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="Output folder (default: output/ next to this script).")
+    parser.add_argument("--clusters", type=int, default=16, help="Number of k-means color clusters (default: 16).")
+    parser.add_argument("--clustering", choices=CLUSTERING_MODES, default="full",
+                        help="full: k-means on every pixel; sample / minibatch: fast fit, then one nearest-center pass.")
+    parser.add_argument("--warm-start", action="store_true",
+                        help="Start clustering from the centers fitted on the previous run of each page.")
+    parser.add_argument("--compare-full", action="store_true",
+                        help="Also run the full fit and report how far the fast palette is from it.")
+    parser.add_argument("--mask-format", choices=MASK_FORMATS, default="color",
+                        help="color: BGR color mask; indexed / rle: region-ID map plus a regions_<name>.json sidecar.")
+    parser.add_argument("--memory-budget", type=int, metavar="MB",
+                        help="Stream each page in strips within about MB of working memory (palette fitted on a sample).")
+    parser.add_argument("--outline-svg", action="store_true",
+                        help="Also write outline_<name>.svg: line art and region boundaries as paths, numbers as text.")
+    args = parser.parse_args()
+    if args.outline_svg and args.memory_budget:
+        parser.error("--outline-svg traces the whole page and cannot be combined with --memory-budget.")
+    main(args.input, args.output, args.clusters, args.clustering, args.warm_start, args.compare_full,
+         args.mask_format, args.memory_budget, args.outline_svg)
@@ -1,12 +1,26 @@
 import numpy as np
 from PIL import Image, ImageDraw
 import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
-# Créer le répertoire de sortie s'il n'existe pas
-output_dir = "output"
-os.makedirs(output_dir, exist_ok=True)
+# Répertoire de sortie par défaut : output/ à côté du script (quel que soit le dossier courant)
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
+# Corpus des pages aléatoires (--random), hors des dossiers input/ et output/ de production :
+# pages/ (pages coloriées à donner à generate_coloring_images.py --input) et truth/ (vérité terrain)
+RANDOM_CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".venv", "random_corpus")
 
-def create_flower():
+# Pages aléatoires (--random) : taille, nombre de régions et de couleurs par défaut
+RANDOM_PAGE_SIZE = (800, 800)
+RANDOM_REGIONS = 40
+RANDOM_COLORS = 12
+# Part des régions qui sont des ellipses posées sur le pavage (formes concaves, anneaux)
+RANDOM_ELLIPSE_SHARE = 0.2
+# Nombre de pixels traités à la fois pour chercher le germe le plus proche
+RANDOM_CHUNK_PIXELS = 1 << 16
+
+def create_flower(output_dir=OUTPUT_DIR):
     # Créer une image de contour (outline)
     outline_img = Image.new('RGBA', (400, 400), (255, 255, 255, 0))
     draw = ImageDraw.Draw(outline_img)
@@ -47,16 +61,13 @@ def create_flower():
     points = [(198, 225), (202, 225), (202, 350), (198, 350)]
     mask_draw.polygon(points, fill=(3, 0, 0))
     
-    # Feuilles (région 4)
-    for i in range(150, 200):
-        for j in range(280, 330):
-            if (i-150)**2 + (j-305)**2 <= 25**2 and j < 305:
-                mask_img.putpixel((i, j), (4, 0, 0))
-    
-    for i in range(200, 250):
-        for j in range(280, 330):
-            if (i-250)**2 + (j-305)**2 <= 25**2 and j < 305:
-                mask_img.putpixel((i, j), (4, 0, 0))
+    # Feuilles (région 4) : deux demi-disques, en un seul masque numpy
+    mask = np.array(mask_img)
+    j, i = np.ogrid[280:330, 150:250]
+    gauche = (i < 200) & ((i-150)**2 + (j-305)**2 <= 25**2)
+    droite = (i >= 200) & ((i-250)**2 + (j-305)**2 <= 25**2)
+    mask[280:330, 150:250][(gauche | droite) & (j < 305)] = (4, 0, 0)
+    mask_img = Image.fromarray(mask)
     
     # Sauvegarder les images
     outline_img.save(os.path.join(output_dir, "outline_flower.png"))
@@ -74,7 +85,7 @@ def create_flower():
     with open(os.path.join(output_dir, "palette_flower.json"), "w") as f:
         f.write(palette_json.strip())
 
-def create_butterfly():
+def create_butterfly(output_dir=OUTPUT_DIR):
     # Créer une image de contour (outline)
     outline_img = Image.new('RGBA', (400, 400), (255, 255, 255, 0))
     draw = ImageDraw.Draw(outline_img)
@@ -149,7 +160,7 @@ def create_butterfly():
     with open(os.path.join(output_dir, "palette_butterfly.json"), "w") as f:
         f.write(palette_json.strip())
 
-def create_cat():
+def create_cat(output_dir=OUTPUT_DIR):
     # Créer une image de contour (outline)
     outline_img = Image.new('RGBA', (400, 400), (255, 255, 255, 0))
     draw = ImageDraw.Draw(outline_img)
@@ -221,8 +232,131 @@ def create_cat():
     with open(os.path.join(output_dir, "palette_cat.json"), "w") as f:
         f.write(palette_json.strip())
 
+def random_region_map(width, height, num_regions, rng):
+    """
+    Carte des régions d'une page aléatoire (entiers 1..num_regions) : pavage de Voronoï
+    de germes aléatoires, sur lequel une partie des régions sont des ellipses.
+    Tout est calculé par masques numpy, sans boucle sur les pixels.
+    """
+    num_ellipses = int(num_regions * RANDOM_ELLIPSE_SHARE)
+    num_cells = max(1, num_regions - num_ellipses)
+    seeds = rng.uniform((0, 0), (width, height), size=(num_cells, 2)).astype(np.float32)
+
+    # Germe le plus proche de chaque pixel, par paquets de lignes
+    region_map = np.empty((height, width), dtype=np.int32)
+    xs = np.arange(width, dtype=np.float32)
+    rows_per_chunk = max(1, RANDOM_CHUNK_PIXELS // width)
+    for y0 in range(0, height, rows_per_chunk):
+        ys = np.arange(y0, min(height, y0 + rows_per_chunk), dtype=np.float32)
+        dx = xs[None, :, None] - seeds[None, None, :, 0]
+        dy = ys[:, None, None] - seeds[None, None, :, 1]
+        region_map[y0:y0 + len(ys)] = (dx ** 2 + dy ** 2).argmin(axis=2) + 1
+
+    y, x = np.ogrid[:height, :width]
+    for index in range(num_ellipses):
+        cx, cy = rng.uniform((0, 0), (width, height))
+        a, b = rng.uniform(0.03, 0.12, size=2) * min(width, height)
+        region_map[((x - cx) / a) ** 2 + ((y - cy) / b) ** 2 <= 1] = num_cells + index + 1
+    return region_map
+
+def create_random_page(name, width, height, num_regions, num_colors, seed, corpus_dir=RANDOM_CORPUS_DIR):
+    """
+    Page de coloriage aléatoire avec sa vérité terrain, même nommage que les pages fixes, dans
+    corpus_dir/truth/ : outline_<nom>.png (contours noirs sur fond transparent), mask_<nom>.png
+    (numéro de couleur de chaque pixel dans le canal rouge, octet de poids fort dans le vert
+    au-delà de 255) et palette_<nom>.json. La page coloriée à donner à generate_coloring_images.py
+    est corpus_dir/pages/<nom>.png.
+    """
+    rng = np.random.default_rng(seed)
+    region_map = random_region_map(width, height, num_regions, rng)
+
+    # Un numéro de couleur par région ; couleurs ni trop sombres ni trop claires (coloriables)
+    colors = rng.integers(40, 221, size=(num_colors, 3), dtype=np.uint8)
+    numbers = np.zeros(region_map.max() + 1, dtype=np.int64)
+    numbers[1:] = rng.integers(1, num_colors + 1, size=region_map.max())
+    number_map = numbers[region_map]
+
+    # Contours : pixels dont le voisin de droite ou du dessous est d'une autre région (et ce voisin)
+    edges = np.zeros((height, width), dtype=bool)
+    horizontal = region_map[:, 1:] != region_map[:, :-1]
+    vertical = region_map[1:, :] != region_map[:-1, :]
+    edges[:, 1:] |= horizontal
+    edges[:, :-1] |= horizontal
+    edges[1:, :] |= vertical
+    edges[:-1, :] |= vertical
+
+    outline = np.zeros((height, width, 4), dtype=np.uint8)
+    outline[edges] = (0, 0, 0, 255)
+    mask = np.zeros((height, width, 3), dtype=np.uint8)
+    mask[..., 0] = number_map & 0xFF
+    mask[..., 1] = number_map >> 8
+    page = colors[number_map - 1]
+    page[edges] = 0
+
+    truth_dir = os.path.join(corpus_dir, "truth")
+    Image.fromarray(outline, 'RGBA').save(os.path.join(truth_dir, f"outline_{name}.png"))
+    Image.fromarray(mask, 'RGB').save(os.path.join(truth_dir, f"mask_{name}.png"))
+    Image.fromarray(page, 'RGB').save(os.path.join(corpus_dir, "pages", f"{name}.png"))
+    palette = [{"number": number, "color": "#{:02X}{:02X}{:02X}".format(*color)}
+               for number, color in enumerate(colors.tolist(), start=1)]
+    with open(os.path.join(truth_dir, f"palette_{name}.json"), "w") as f:
+        json.dump(palette, f, indent=4)
+    return name
+
+def _create_random_page(job):
+    return create_random_page(*job)
+
+def create_random_pages(count, size=RANDOM_PAGE_SIZE, num_regions=RANDOM_REGIONS, num_colors=RANDOM_COLORS,
+                        seed=0, corpus_dir=RANDOM_CORPUS_DIR, jobs=None):
+    """
+    Génère count pages aléatoires (random_0000, random_0001, ...) en parallèle dans corpus_dir.
+    Chaque page a sa propre graine dérivée de (seed, indice) : le corpus est le même quel que
+    soit jobs.
+    """
+    for subdir in ("pages", "truth"):
+        os.makedirs(os.path.join(corpus_dir, subdir), exist_ok=True)
+    width, height = size
+    job_args = [(f"random_{index:04d}", width, height, num_regions, num_colors, [seed, index], corpus_dir)
+                for index in range(count)]
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and count > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(_create_random_page, job_args, chunksize=8))
+    return [_create_random_page(job) for job in job_args]
+
 if __name__ == "__main__":
-    create_flower()
-    create_butterfly()
-    create_cat()
-    print("Images de test générées avec succès dans le dossier 'output'")
+    parser = argparse.ArgumentParser(description="Génère les images de test du livre de coloriage.")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="Dossier de sortie (défaut : output/ à côté du script).")
+    parser.add_argument("--corpus", default=RANDOM_CORPUS_DIR,
+                        help="Dossier du corpus de --random, avec pages/ et truth/ "
+                             "(défaut : .venv/random_corpus/ à côté du script).")
+    parser.add_argument("--random", type=int, default=0, metavar="N",
+                        help="Génère N pages aléatoires au lieu des trois pages fixes.")
+    parser.add_argument("--size", default=f"{RANDOM_PAGE_SIZE[0]}x{RANDOM_PAGE_SIZE[1]}", metavar="LxH",
+                        help="Taille des pages aléatoires (défaut : %(default)s).")
+    parser.add_argument("--regions", type=int, default=RANDOM_REGIONS,
+                        help="Nombre de régions par page aléatoire (défaut : %(default)s).")
+    parser.add_argument("--colors", type=int, default=RANDOM_COLORS,
+                        help="Nombre de couleurs de la palette, 65535 au plus (défaut : %(default)s).")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du corpus aléatoire (défaut : 0).")
+    parser.add_argument("--jobs", type=int, help="Nombre de processus (défaut : nombre de cœurs).")
+    args = parser.parse_args()
+
+    if args.random:
+        try:
+            size = tuple(int(v) for v in args.size.lower().split("x"))
+        except ValueError:
+            size = ()
+        if len(size) != 2 or not 1 <= args.colors <= 0xFFFF:
+            parser.error("--size attend LARGEURxHAUTEUR et --colors un nombre entre 1 et 65535")
+        pages = create_random_pages(args.random, size, args.regions, args.colors, args.seed, args.corpus, args.jobs)
+        print(f"{len(pages)} pages aléatoires générées dans le dossier '{args.corpus}'. Pour les traiter :")
+        print(f"  python generate_coloring_images.py --input {os.path.join(args.corpus, 'pages')} "
+              f"--output {os.path.join(args.corpus, 'output')}")
+    else:
+        # Créer le répertoire de sortie s'il n'existe pas
+        os.makedirs(args.output, exist_ok=True)
+        create_flower(args.output)
+        create_butterfly(args.output)
+        create_cat(args.output)
+        print(f"Images de test générées avec succès dans le dossier '{args.output}'")
@@ -0,0 +1,267 @@
+import cv2
+import numpy as np
+import os
+import io
+import json
+import time
+import sys
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import contextlib
+
+from generate_level_data import (
+    IMAGES_DIRECTORY,
+    NUM_DIFFERENCES_TARGET,
+    DEFAULT_RADIUS_RATIO,
+    MULTISCALE_TOLERANCE,
+    REDUCED_GRAYSCALE_FLAGS,
+    process_image_pair,
+)
+
+# --- CONFIGURATION ---
+# Résolution par défaut des paires synthétiques (celle de nos niveaux)
+DEFAULT_SIZE = (900, 1273)
+# Qualité JPEG du réencodage (bruit de compression)
+DEFAULT_JPEG_QUALITY = 85
+# Écart d'échelle appliqué à l'image modifiée avant réencodage (0.01 = 1 %)
+DEFAULT_SCALE_MISMATCH = 0.01
+# Taille d'une différence insérée, en fraction de la largeur (min, max)
+DIFFERENCE_SIZE_RANGE = (0.03, 0.07)
+# Distance minimale entre deux différences insérées, en fraction de la largeur
+MIN_DIFFERENCE_SPACING = 0.12
+# Une différence détectée est juste si elle tombe à moins de ce rayon (normalisé) de la vérité
+MATCH_RADIUS = DEFAULT_RADIUS_RATIO
+# Rapport JSON du benchmark
+BENCHMARK_REPORT_FILE = os.path.join(IMAGES_DIRECTORY, ".venv", "benchmark_report.json")
+# Unité de ru_maxrss : octets sous macOS, kilo-octets sous Linux
+RU_MAXRSS_BYTES = 1 if sys.platform == "darwin" else 1024
+
+
+def _random_background(rng, width, height):
+    """
+    Fond texturé : bruit basse fréquence agrandi puis formes aléatoires, pour que le
+    détecteur ait de vrais contours et du bruit JPEG à ignorer.
+    """
+    low = rng.integers(0, 256, size=(max(2, height // 64), max(2, width // 64), 3), dtype=np.uint8)
+    image = cv2.resize(low, (width, height), interpolation=cv2.INTER_CUBIC)
+    for _ in range(40):
+        color = tuple(int(c) for c in rng.integers(0, 256, size=3))
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        size = int(rng.integers(width // 40, width // 8))
+        if rng.random() < 0.5:
+            cv2.circle(image, (x, y), size, color, -1)
+        else:
+            cv2.rectangle(image, (x - size, y - size), (x + size, y + size), color, -1)
+    return image
+
+
+def _difference_positions(rng, width, height, count):
+    spacing = MIN_DIFFERENCE_SPACING * width
+    margin = DIFFERENCE_SIZE_RANGE[1] * width
+    positions = []
+    attempts = 0
+    while len(positions) < count:
+        attempts += 1
+        if attempts > 10000:
+            raise ValueError(f"Impossible de placer {count} différences sur une image {width}x{height}.")
+        x = rng.uniform(margin, width - margin)
+        y = rng.uniform(margin, height - margin)
+        if all(np.hypot(x - px, y - py) >= spacing for px, py in positions):
+            positions.append((x, y))
+    return positions
+
+
+def make_synthetic_pair(rng, width, height, num_differences=NUM_DIFFERENCES_TARGET,
+                        jpeg_quality=DEFAULT_JPEG_QUALITY, scale_mismatch=DEFAULT_SCALE_MISMATCH):
+    """
+    Génère une paire originale / modifiée avec num_differences différences connues.
+
+    Les deux images sont réencodées en JPEG (bruit de compression) et l'image modifiée est
+    légèrement redimensionnée (écart d'échelle) avant réencodage, comme nos sources réelles.
+    Renvoie (original_jpeg, modified_jpeg, truth) : octets JPEG et liste de
+    {'x', 'y'} normalisés des centres des différences.
+    """
+    original = _random_background(rng, width, height)
+    modified = original.copy()
+    truth = []
+    for x, y in _difference_positions(rng, width, height, num_differences):
+        size = rng.uniform(*DIFFERENCE_SIZE_RANGE) * width / 2
+        x0, y0 = int(x - size), int(y - size)
+        x1, y1 = int(x + size), int(y + size)
+        # Le détecteur travaille en niveaux de gris : on choisit une couleur dont la luminance
+        # contraste avec la zone d'origine (sombre sur fond clair, claire sur fond sombre).
+        local_gray = cv2.cvtColor(original[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY).mean()
+        low, high = (0, 70) if local_gray > 128 else (185, 256)
+        color = tuple(int(c) for c in rng.integers(low, high, size=3))
+        if rng.random() < 0.5:
+            cv2.ellipse(modified, (int(x), int(y)), (int(size), int(size * rng.uniform(0.5, 1.0))),
+                        float(rng.uniform(0, 180)), 0, 360, color, -1)
+        else:
+            cv2.rectangle(modified, (x0, y0), (x1, y1), color, -1)
+        truth.append({'x': x / width, 'y': y / height})
+
+    if scale_mismatch:
+        modified = cv2.resize(modified, (int(round(width * (1 + scale_mismatch))),
+                                         int(round(height * (1 + scale_mismatch)))))
+    params = [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+    return cv2.imencode(".jpg", original, params)[1].tobytes(), cv2.imencode(".jpg", modified, params)[1].tobytes(), truth
+
+
+def match_spots(spots, truth, match_radius=MATCH_RADIUS):
+    """
+    Appariement glouton (plus proches d'abord) des différences détectées avec la vérité.
+    Renvoie le nombre de détections correctes.
+    """
+    candidates = []
+    for i, spot in enumerate(spots):
+        for j, t in enumerate(truth):
+            distance = np.hypot(spot['x'] - t['x'], spot['y'] - t['y'])
+            if distance <= match_radius:
+                candidates.append((distance, i, j))
+    used_spots, used_truth = set(), set()
+    for _, i, j in sorted(candidates):
+        if i not in used_spots and j not in used_truth:
+            used_spots.add(i)
+            used_truth.add(j)
+    return len(used_spots)
+
+
+def spot_drift(spots, reference):
+    """
+    Écart maximal, sur x ou y normalisés, entre deux résultats de process_image_pair :
+    chaque différence est comparée à la plus proche de l'autre liste. Infini si l'un des deux
+    rejette la paire ou si le nombre de différences n'est pas le même.
+    """
+    spots, reference = spots or [], reference or []
+    if len(spots) != len(reference):
+        return float("inf")
+    drift = 0.0
+    for a, b in ((spots, reference), (reference, spots)):
+        for spot in a:
+            drift = max(drift, min(max(abs(spot['x'] - other['x']), abs(spot['y'] - other['y'])) for other in b))
+    return drift
+
+
+def run_benchmark(num_pairs, sizes=(DEFAULT_SIZE,), jpeg_quality=DEFAULT_JPEG_QUALITY,
+                  scale_mismatch=DEFAULT_SCALE_MISMATCH, seed=0, check_multiscale=False, **options):
+    """
+    Génère num_pairs paires synthétiques (réparties sur les résolutions de sizes), lance
+    process_image_pair sur chacune et renvoie débit, mémoire et précision / rappel.
+    Les options (multiscale, decode_scale...) sont transmises à process_image_pair.
+    Avec check_multiscale, chaque paire est aussi analysée (hors chronométrage) avec et sans
+    multiscale, et l'écart maximal des coordonnées est comparé à MULTISCALE_TOLERANCE.
+    """
+    rng = np.random.default_rng(seed)
+    pairs = []
+    with tempfile.TemporaryDirectory(prefix="ftd_benchmark_") as workdir:
+        for idx in range(num_pairs):
+            width, height = sizes[idx % len(sizes)]
+            original_bytes, modified_bytes, truth = make_synthetic_pair(
+                rng, width, height, jpeg_quality=jpeg_quality, scale_mismatch=scale_mismatch)
+            original_path = os.path.join(workdir, f"level{idx + 1}_original.jpg")
+            modified_path = os.path.join(workdir, f"level{idx + 1}_modified.jpg")
+            with open(original_path, 'wb') as f:
+                f.write(original_bytes)
+            with open(modified_path, 'wb') as f:
+                f.write(modified_bytes)
+            pairs.append((original_path, modified_path, truth, (width, height)))
+
+        results = []
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        tracemalloc.start()
+        start = time.perf_counter()
+        for original_path, modified_path, truth, size in pairs:
+            pair_start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                spots = process_image_pair(original_path, modified_path, **options)
+            elapsed = time.perf_counter() - pair_start
+            spots = spots or []
+            results.append({
+                "pair": os.path.basename(original_path),
+                "size": list(size),
+                "seconds": elapsed,
+                "detected": len(spots),
+                "truth": len(truth),
+                "matched": match_spots(spots, truth),
+            })
+        total_seconds = time.perf_counter() - start
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        drifts = []
+        if check_multiscale:
+            for (original_path, modified_path, _, _), result in zip(pairs, results):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    reference = process_image_pair(original_path, modified_path, **{**options, "multiscale": False})
+                    multiscale = process_image_pair(original_path, modified_path, **{**options, "multiscale": True})
+                result["multiscale_drift"] = spot_drift(multiscale, reference)
+                drifts.append(result["multiscale_drift"])
+
+    detected = sum(r["detected"] for r in results)
+    matched = sum(r["matched"] for r in results)
+    truth_total = sum(r["truth"] for r in results)
+    return {
+        "options": options,
+        "pairs": len(results),
+        "jpeg_quality": jpeg_quality,
+        "scale_mismatch": scale_mismatch,
+        "seed": seed,
+        "pairs_per_second": len(results) / total_seconds if total_seconds else 0.0,
+        "seconds_per_pair_p50": float(np.percentile([r["seconds"] for r in results], 50)),
+        "peak_traced_mb": peak_traced / 2 ** 20,
+        # Pic du processus, pas seulement du détecteur.
+        "max_rss_mb": max(rss_before, rss_after) * RU_MAXRSS_BYTES / 2 ** 20,
+        "precision": matched / detected if detected else 0.0,
+        "recall": matched / truth_total if truth_total else 0.0,
+        "rejected_pairs": sum(1 for r in results if r["detected"] == 0),
+        "multiscale_max_drift": max(drifts) if drifts else None,
+        "multiscale_within_tolerance": all(d <= MULTISCALE_TOLERANCE for d in drifts) if drifts else None,
+        "details": results,
+    }
+
+
+def _parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Mesure le débit et la précision du détecteur sur des paires synthétiques à vérité connue.")
+    parser.add_argument("--pairs", type=int, default=50, help="Nombre de paires générées (défaut : 50).")
+    parser.add_argument("--size", type=_parse_size, nargs="+", default=[DEFAULT_SIZE],
+                        help="Résolutions LARGEURxHAUTEUR, utilisées à tour de rôle (défaut : 900x1273).")
+    parser.add_argument("--quality", type=int, default=DEFAULT_JPEG_QUALITY, help="Qualité JPEG du réencodage.")
+    parser.add_argument("--scale-mismatch", type=float, default=DEFAULT_SCALE_MISMATCH,
+                        help="Écart d'échelle de l'image modifiée (0.01 = 1 %%).")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du générateur (résultats reproductibles).")
+    parser.add_argument("--multiscale", action="store_true", help="Utilise le mode multi-échelle du détecteur.")
+    parser.add_argument("--decode-scale", type=int, choices=sorted(REDUCED_GRAYSCALE_FLAGS), default=1,
+                        help="Décode les images à 1/N de leur taille.")
+    parser.add_argument("--check-multiscale", action="store_true",
+                        help=f"Vérifie que le mode multi-échelle reste à {MULTISCALE_TOLERANCE} près du mode classique.")
+    parser.add_argument("--report", default=BENCHMARK_REPORT_FILE, help="Fichier JSON du rapport détaillé.")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.pairs, sizes=args.size, jpeg_quality=args.quality,
+                           scale_mismatch=args.scale_mismatch, seed=args.seed, check_multiscale=args.check_multiscale,
+                           multiscale=args.multiscale, decode_scale=args.decode_scale)
+
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Paires : {report['pairs']} ({report['rejected_pairs']} rejetées)")
+    print(f"Débit : {report['pairs_per_second']:.2f} paires/s (médiane {report['seconds_per_pair_p50'] * 1000:.1f} ms/paire)")
+    print(f"Mémoire : pic tracé {report['peak_traced_mb']:.1f} Mo, RSS max {report['max_rss_mb']:.1f} Mo")
+    print(f"Précision : {report['precision']:.3f}  Rappel : {report['recall']:.3f}")
+    if args.check_multiscale:
+        print(f"Écart multi-échelle / classique : {report['multiscale_max_drift']:.4f} "
+              f"(tolérance {MULTISCALE_TOLERANCE})")
+    print(f"\n✅ Rapport exporté : {args.report}")
+    if args.check_multiscale and not report["multiscale_within_tolerance"]:
+        print(f"❌ Écart multi-échelle supérieur à la tolérance ({MULTISCALE_TOLERANCE}).")
+        raise SystemExit(1)
@@ -1,19 +1,39 @@
 import cv2
 import numpy as np
 from skimage.metrics import structural_similarity as ssim
-import imutils
 import os
+import sys
 import re
 import json
 import shutil # Added for file operations
+import argparse
+import hashlib
+import csv
+import time
+import contextlib
+import fnmatch
+import queue
+import threading
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor
+
+# Utilitaires partagés avec les outils du dépôt (tools/asset_utils.py), importés plus bas
+TOOLS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "tools")
+if TOOLS_DIRECTORY not in sys.path:
+    sys.path.append(TOOLS_DIRECTORY)
+
+from asset_utils import file_digest, params_digest, load_json_cache, save_json_cache, init_worker
+from level_data_export import EXPORT_FORMATS, LevelShardWriter, format_levels_json, write_file_atomic
 
 # --- CONFIGURATION ---
-# MODIFICATION : Le script cherche maintenant les images dans le même dossier que lui.
-IMAGES_DIRECTORY = "."
+# MODIFICATION : Le script cherche maintenant les images dans le même dossier que lui
+# (quel que soit le dossier depuis lequel il est lancé).
+IMAGES_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
 # Dossier pour les images avec un nombre incorrect de différences
 INVALID_IMAGES_FOLDER = os.path.join(IMAGES_DIRECTORY, ".venv", "Images_with_less")
 # Fichier de sortie pour le code Dart
-DART_OUTPUT_FILE = "../../../lib/games/find_the_differences/components/level_data.dart"
+DART_OUTPUT_FILE = os.path.normpath(os.path.join(
+    IMAGES_DIRECTORY, "..", "..", "..", "lib", "games", "find_the_differences", "components", "level_data.dart"))
 # Préfixe du chemin d'accès utilisé dans votre application Flutter
 ASSETS_PATH_PREFIX = "assets/images/find_the_differences/"
 # Nombre de différences à trouver par image
@@ -22,106 +42,532 @@ NUM_DIFFERENCES_TARGET = 7
 MIN_CONTOUR_AREA = 20
 # Rayon par défaut si une différence est trop petite (en pourcentage de la largeur)
 DEFAULT_RADIUS_RATIO = 0.045
+# Seuil fixe appliqué à la différence absolue des images floutées
+THRESHOLD_VALUE = 20
+# Taille des noyaux : flou gaussien, fermeture et dilatation
+BLUR_KERNEL_SIZE = (3, 3)
+CLOSE_KERNEL_SIZE = (3, 3)
+DILATE_KERNEL_SIZE = (7, 7)
+# Cache des différences détectées (clé : contenu des deux images + paramètres de détection)
+SPOTS_CACHE_FILE = os.path.join(IMAGES_DIRECTORY, ".venv", "level_data_cache.json")
+# Mode multi-échelle : nombre de niveaux de pyramide (2 -> détection grossière au 1/4)
+PYRAMID_LEVELS = 2
+# Au-delà de cette fraction de l'image couverte par les fenêtres, on repasse en pleine résolution
+MULTISCALE_MAX_COVERAGE = 0.5
+# Écart maximal toléré sur x/y normalisés entre le mode multi-échelle et le mode classique
+# (vérifié par benchmark_detector.py --check-multiscale ; les régions sont en fait identiques)
+MULTISCALE_TOLERANCE = 0.01
+# Drapeaux de décodage réduit d'OpenCV (en niveaux de gris / en couleur) par facteur d'échelle
+REDUCED_GRAYSCALE_FLAGS = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+REDUCED_COLOR_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
 
+def _scaled_kernel(size, decode_scale, odd=False):
+    scaled = []
+    for k in size:
+        k = max(1, int(round(k / decode_scale)))
+        if odd and k % 2 == 0:
+            k += 1
+        scaled.append(k)
+    return tuple(scaled)
 
-def process_image_pair(original_path, modified_path):
+
+def pipeline_settings(decode_scale=1, blur_kernel_size=BLUR_KERNEL_SIZE, threshold_value=THRESHOLD_VALUE,
+                      close_kernel_size=CLOSE_KERNEL_SIZE, dilate_kernel_size=DILATE_KERNEL_SIZE,
+                      min_contour_area=MIN_CONTOUR_AREA):
     """
-    Analyse une paire d'images avec une méthode robuste aux artefacts JPEG.
+    Paramètres en pixels de la chaîne de détection, ramenés à l'échelle de décodage
+    (noyaux divisés par decode_scale, aire minimale par decode_scale²).
+    Les valeurs par défaut sont les constantes du module ; le mode balayage les remplace.
     """
-    image_originale = cv2.imread(original_path)
-    image_modifiee = cv2.imread(modified_path)
+    return {
+        "blur_kernel_size": _scaled_kernel(blur_kernel_size, decode_scale, odd=True),
+        "threshold_value": threshold_value,
+        "close_kernel_size": _scaled_kernel(close_kernel_size, decode_scale),
+        "dilate_kernel_size": _scaled_kernel(dilate_kernel_size, decode_scale),
+        "min_contour_area": min_contour_area / (decode_scale ** 2),
+    }
 
-    if image_originale is None or image_modifiee is None:
-        print(f"  -> Erreur: Impossible de charger {original_path} ou {modified_path}")
-        return []
 
-    hauteur, largeur, _ = image_originale.shape
-    image_modifiee = cv2.resize(image_modifiee, (largeur, hauteur))
+def stage_keys(settings):
+    """
+    Clé de chaque étape de _difference_mask : une étape ne dépend que de ses propres
+    paramètres et de ceux des étapes précédentes, d'où des clés préfixes les unes des autres.
+    """
+    blur = ("blur", settings["blur_kernel_size"])
+    thresh = blur + ("thresh", settings["threshold_value"])
+    closed = thresh + ("close", settings["close_kernel_size"])
+    dilated = closed + ("dilate", settings["dilate_kernel_size"])
+    return {"blur": blur, "diff": blur + ("diff",), "thresh": thresh, "close": closed, "dilate": dilated}
 
-    # --- Debugging level9 ---
-    is_level9 = "level9" in original_path.lower()
-    debug_dir = None
-    if is_level9:
-        debug_dir = os.path.join(os.path.dirname(original_path), "debug_level9")
-        os.makedirs(debug_dir, exist_ok=True)
-        print(f"  ---> DEBUGGING level9: Saving intermediate images to {debug_dir}")
-    # --- End Debugging level9 ---
 
-    gris_original = cv2.cvtColor(image_originale, cv2.COLOR_BGR2GRAY)
-    gris_modifie = cv2.cvtColor(image_modifiee, cv2.COLOR_BGR2GRAY)
-    if is_level9 and debug_dir:
-        cv2.imwrite(os.path.join(debug_dir, "level9_1_gris_original.png"), gris_original)
-        cv2.imwrite(os.path.join(debug_dir, "level9_1_gris_modifie.png"), gris_modifie)
+def _memoized(memo, key, compute):
+    if memo is None:
+        return compute()
+    if key not in memo:
+        memo[key] = compute()
+    return memo[key]
+
+
+# Étapes chronométrées par DetectionStats, dans l'ordre de la chaîne. Le décodage se fait
+# directement en niveaux de gris : la conversion couleur -> gris est comprise dans "decode".
+STATS_STAGES = ("decode", "resize", "pyramid", "blur", "absdiff", "threshold", "morphology", "contours", "selection")
+
+
+class DetectionStats:
+    """
+    Temps passé dans chaque étape (secondes, cumulés si une étape est répétée, par exemple
+    sur les fenêtres du mode multi-échelle) et compteurs d'une analyse de paire.
+    """
+
+    def __init__(self, pair=None):
+        self.pair = pair
+        self.timings = {}
+        self.counters = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def as_dict(self):
+        return {"pair": self.pair, "timings": self.timings, "counters": self.counters}
+
+
+class _NoStats:
+    # Remplaçant sans effet quand aucune instrumentation n'est demandée.
+    def stage(self, name):
+        return contextlib.nullcontext()
+
+    def count(self, name, value):
+        pass
+
+
+_NO_STATS = _NoStats()
+
+
+def load_gray_pair(original_path, modified_path, decode_scale=1, stats=None):
+    """
+    Décode directement les deux images en niveaux de gris, éventuellement à échelle réduite
+    (le décodeur JPEG réduit alors pendant la décompression). L'image modifiée n'est
+    redimensionnée que si ses dimensions diffèrent de l'originale.
+    Renvoie (None, None) si l'une des images ne peut pas être chargée.
+    """
+    stats = stats or _NO_STATS
+    flag = REDUCED_GRAYSCALE_FLAGS[decode_scale]
+    with stats.stage("decode"):
+        gris_original = cv2.imread(original_path, flag)
+        gris_modifie = cv2.imread(modified_path, flag)
+    if gris_original is None or gris_modifie is None:
+        return None, None
+
+    if gris_modifie.shape != gris_original.shape:
+        hauteur, largeur = gris_original.shape
+        with stats.stage("resize"):
+            gris_modifie = cv2.resize(gris_modifie, (largeur, hauteur))
+    return gris_original, gris_modifie
+
+
+def _difference_mask(gris_original, gris_modifie, settings, save_debug=None, memo=None, stats=None):
+    """
+    Chaîne flou -> différence absolue -> seuil -> fermeture -> dilatation.
+    Toutes les étapes sont locales : le résultat en un pixel ne dépend que d'un voisinage
+    de _mask_halo(settings) pixels, ce qui permet de l'appliquer sur des fenêtres (mode multi-échelle).
+
+    Avec memo (un dict propre à la paire), chaque étape est mémorisée sous stage_keys(settings) :
+    changer seulement le seuil réutilise les images floutées et la différence absolue.
+    """
+    keys = stage_keys(settings)
+    stats = stats or _NO_STATS
 
     # --- DÉBUT DES MODIFICATIONS STRATÉGIQUES ---
 
     # NOUVELLE ETAPE 1: Flouter les deux images pour supprimer le bruit de compression JPEG
     # Le noyau (5, 5) est une bonne valeur de départ.
-    blur_original = cv2.GaussianBlur(gris_original, (3, 3), 0)
-    blur_modifie = cv2.GaussianBlur(gris_modifie, (3, 3), 0)
-    if is_level9 and debug_dir:
-        cv2.imwrite(os.path.join(debug_dir, "level9_2_blur_original.png"), blur_original)
-        cv2.imwrite(os.path.join(debug_dir, "level9_2_blur_modifie.png"), blur_modifie)
+    with stats.stage("blur"):
+        blur_original, blur_modifie = _memoized(memo, keys["blur"], lambda: (
+            cv2.GaussianBlur(gris_original, settings["blur_kernel_size"], 0),
+            cv2.GaussianBlur(gris_modifie, settings["blur_kernel_size"], 0),
+        ))
+    if save_debug:
+        save_debug("2_blur_original", blur_original)
+        save_debug("2_blur_modifie", blur_modifie)
 
     # METHODE DE COMPARAISON MODIFIÉE: Différence absolue sur les images floutées
-    diff = cv2.absdiff(blur_original, blur_modifie)
-    if is_level9 and debug_dir:
-        cv2.imwrite(os.path.join(debug_dir, "level9_3_diff_abs.png"), diff)
+    with stats.stage("absdiff"):
+        diff = _memoized(memo, keys["diff"], lambda: cv2.absdiff(blur_original, blur_modifie))
+    if save_debug:
+        save_debug("3_diff_abs", diff)
 
     # SEUIL MODIFIÉ: On utilise un seuil fixe pour mieux contrôler la sensibilité
     # Une valeur entre 25 et 50 est généralement un bon point de départ.
     # Si des différences sont manquées, baissez cette valeur. Si trop de bruit est détecté, augmentez-la.
-    _, thresh = cv2.threshold(diff, 20, 255, cv2.THRESH_BINARY)
-    if is_level9 and debug_dir:
-        cv2.imwrite(os.path.join(debug_dir, "level9_4_thresh.png"), thresh)
-    
+    with stats.stage("threshold"):
+        thresh = _memoized(memo, keys["thresh"], lambda: cv2.threshold(
+            diff, settings["threshold_value"], 255, cv2.THRESH_BINARY)[1])
+    if save_debug:
+        save_debug("4_thresh", thresh)
+
     # On garde les opérations morphologiques pour nettoyer et grouper le résultat
     # On réduit la taille du noyau de fermeture pour être moins agressif
-    kernel_close = np.ones((3, 3), np.uint8)
-    thresh_closed = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel_close)
-    if is_level9 and debug_dir:
-        cv2.imwrite(os.path.join(debug_dir, "level9_5_thresh_closed.png"), thresh_closed)
+    kernel_close = np.ones(settings["close_kernel_size"], np.uint8)
+    with stats.stage("morphology"):
+        thresh_closed = _memoized(memo, keys["close"], lambda: cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel_close))
+    if save_debug:
+        save_debug("5_thresh_closed", thresh_closed)
 
     # On réduit la taille du noyau de dilatation pour éviter de fusionner les différences proches
-    kernel_dilate = np.ones((7, 7), np.uint8)
+    kernel_dilate = np.ones(settings["dilate_kernel_size"], np.uint8)
     # On réduit le nombre d'itérations de dilatation
-    thresh_dilated = cv2.dilate(thresh_closed, kernel_dilate, iterations=1)
-    if is_level9 and debug_dir:
-        cv2.imwrite(os.path.join(debug_dir, "level9_6_thresh_dilated.png"), thresh_dilated)
+    with stats.stage("morphology"):
+        thresh_dilated = _memoized(memo, keys["dilate"], lambda: cv2.dilate(thresh_closed, kernel_dilate, iterations=1))
+    if save_debug:
+        save_debug("6_thresh_dilated", thresh_dilated)
 
     # --- FIN DES MODIFICATIONS STRATÉGIQUES ---
+    return thresh_dilated
+
 
-    contours = cv2.findContours(thresh_dilated.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    contours = imutils.grab_contours(contours)
+def _mask_halo(settings):
+    # Rayon d'influence cumulé du flou, de la fermeture (dilatation + érosion) et de la dilatation.
+    return (max(settings["blur_kernel_size"]) // 2 + 2 * (max(settings["close_kernel_size"]) // 2)
+            + max(settings["dilate_kernel_size"]) // 2 + 1)
+
+
+def _pooled_mask(mask, factor):
+    """
+    Réduction par maximum de blocs factor x factor : un pixel réduit est allumé si l'un
+    des pixels de son bloc l'est (INTER_AREA sur une image complétée à un multiple de factor).
+    """
+    hauteur, largeur = mask.shape[:2]
+    padded = cv2.copyMakeBorder(mask, 0, -hauteur % factor, 0, -largeur % factor, cv2.BORDER_CONSTANT, value=0)
+    pooled = cv2.resize(padded, (padded.shape[1] // factor, padded.shape[0] // factor), interpolation=cv2.INTER_AREA)
+    return (pooled > 0).astype(np.uint8)
+
+
+def _merge_windows(windows):
+    # Fusionne les fenêtres qui se chevauchent ou se touchent, jusqu'à ce qu'elles soient disjointes.
+    windows = list(windows)
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        for window in windows:
+            for i, other in enumerate(result):
+                if window[0] <= other[2] and other[0] <= window[2] and window[1] <= other[3] and other[1] <= window[3]:
+                    result[i] = (min(window[0], other[0]), min(window[1], other[1]),
+                                 max(window[2], other[2]), max(window[3], other[3]))
+                    merged = True
+                    break
+            else:
+                result.append(window)
+        windows = result
+    return windows
+
+
+def _multiscale_regions(gris_original, gris_modifie, settings, stats=None, memo=None):
+    """
+    Régions de différence calculées sans traiter toute l'image en pleine résolution :
+
+      1. flou, différence absolue et seuil en pleine résolution (passes bon marché), puis
+         réduction par maximum de blocs 2**PYRAMID_LEVELS : aucun pixel seuillé n'est perdu ;
+      2. fermeture, dilatation et étiquetage uniquement dans des fenêtres disjointes autour
+         des composantes réduites (élargies du halo de la chaîne, et agrandies tant qu'une
+         région touche leur bord).
+
+    Tout pixel du masque pleine résolution est à moins du halo d'un pixel seuillé, donc dans
+    une fenêtre : les régions (aires, boîtes) sont exactement celles du mode classique, dans le
+    même ordre (premier pixel en balayage), et les coordonnées x/y sont identiques
+    (benchmark_detector.py --check-multiscale le vérifie contre MULTISCALE_TOLERANCE).
+
+    Rejet anticipé : tant que deux blocs voisins ne peuvent pas donner deux régions
+    distinctes après dilatation (2 * facteur - 1 <= noyau de dilatation), chaque composante
+    réduite contient au plus une région ; moins de NUM_DIFFERENCES_TARGET composantes
+    garantit donc un rejet, et la fonction renvoie None. Sinon (décodage réduit, petits
+    noyaux), une paire courte au niveau réduit est traitée en pleine résolution.
+
+    Renvoie (aires, boîtes (x, y, w, h), fenêtres [(x0, y0, masque)]), ou None.
+    """
+    stats = stats or _NO_STATS
+    # Flou, différence et seuil sont mémorisés : le repli en pleine résolution les reprend.
+    memo = {} if memo is None else memo
+    keys = stage_keys(settings)
+    hauteur, largeur = gris_original.shape[:2]
+    factor = 2 ** PYRAMID_LEVELS
+
+    with stats.stage("blur"):
+        blur_original, blur_modifie = _memoized(memo, keys["blur"], lambda: (
+            cv2.GaussianBlur(gris_original, settings["blur_kernel_size"], 0),
+            cv2.GaussianBlur(gris_modifie, settings["blur_kernel_size"], 0),
+        ))
+    with stats.stage("absdiff"):
+        diff = _memoized(memo, keys["diff"], lambda: cv2.absdiff(blur_original, blur_modifie))
+    with stats.stage("threshold"):
+        thresh = _memoized(memo, keys["thresh"], lambda: cv2.threshold(
+            diff, settings["threshold_value"], 255, cv2.THRESH_BINARY)[1])
+    with stats.stage("pyramid"):
+        num_labels, _, coarse_stats, _ = cv2.connectedComponentsWithStats(_pooled_mask(thresh, factor), connectivity=8)
+    stats.count("coarse_candidates", num_labels - 1)
+
+    halo = _mask_halo(settings)
+    margin = factor + halo
+    windows = []
+    for bx, by, bw, bh, _ in coarse_stats[1:]:
+        windows.append((max(0, bx * factor - margin), max(0, by * factor - margin),
+                        min(largeur, (bx + bw) * factor + margin), min(hauteur, (by + bh) * factor + margin)))
+    windows = _merge_windows(windows)
+    covered = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in windows)
+
+    rejection_is_exact = 2 * factor - 1 <= min(settings["dilate_kernel_size"])
+    if num_labels - 1 < NUM_DIFFERENCES_TARGET and rejection_is_exact:
+        return None
+    # Trop de fenêtres (image bruitée), ou rejet non garanti : pleine résolution, étapes déjà faites reprises.
+    if covered > MULTISCALE_MAX_COVERAGE * largeur * hauteur or num_labels - 1 < NUM_DIFFERENCES_TARGET:
+        mask = _difference_mask(gris_original, gris_modifie, settings, memo=memo, stats=stats)
+        with stats.stage("contours"):
+            _, areas, boxes, _ = extract_regions(mask)
+        return areas, boxes, [(0, 0, mask)]
+
+    kernel_close = np.ones(settings["close_kernel_size"], np.uint8)
+    kernel_dilate = np.ones(settings["dilate_kernel_size"], np.uint8)
+
+    def window_mask(x0, y0, x1, y1):
+        # Calcul sur la fenêtre élargie du halo, puis on ne garde que l'intérieur.
+        hx0, hy0 = max(0, x0 - halo), max(0, y0 - halo)
+        hx1, hy1 = min(largeur, x1 + halo), min(hauteur, y1 + halo)
+        with stats.stage("morphology"):
+            closed = cv2.morphologyEx(thresh[hy0:hy1, hx0:hx1], cv2.MORPH_CLOSE, kernel_close)
+            dilated = cv2.dilate(closed, kernel_dilate, iterations=1)
+        return dilated[y0 - hy0:y1 - hy0, x0 - hx0:x1 - hx0]
+
+    # Une région coupée par le bord d'une fenêtre fausserait son centre : on agrandit la
+    # fenêtre de ce côté, on refusionne les fenêtres et on recommence.
+    while True:
+        masks = []
+        grown_windows = []
+        for x0, y0, x1, y1 in windows:
+            interior = window_mask(x0, y0, x1, y1)
+            grown = (
+                max(0, x0 - margin) if x0 > 0 and interior[:, 0].any() else x0,
+                max(0, y0 - margin) if y0 > 0 and interior[0, :].any() else y0,
+                min(largeur, x1 + margin) if x1 < largeur and interior[:, -1].any() else x1,
+                min(hauteur, y1 + margin) if y1 < hauteur and interior[-1, :].any() else y1,
+            )
+            grown_windows.append(grown)
+            masks.append((x0, y0, interior))
+        if grown_windows == windows:
+            break
+        windows = _merge_windows(grown_windows)
+
+    all_areas, all_boxes, first_pixels = [], [], []
+    with stats.stage("contours"):
+        for x0, y0, interior in masks:
+            labels, areas, boxes, _ = extract_regions(interior)
+            if not len(areas):
+                continue
+            # Premier pixel de chaque région en balayage : l'ordre d'étiquetage de l'image entière.
+            _, first = np.unique(labels.ravel(), return_index=True)
+            first_y, first_x = np.divmod(first[1:], interior.shape[1])
+            first_pixels.append((first_y + y0) * largeur + first_x + x0)
+            all_areas.append(areas)
+            all_boxes.append(boxes + np.array([x0, y0, 0, 0], dtype=boxes.dtype))
+    if not all_areas:
+        return np.zeros(0, dtype=np.int32), np.zeros((0, 4), dtype=np.int32), masks
+    order = np.argsort(np.concatenate(first_pixels), kind='stable')
+    return np.concatenate(all_areas)[order], np.concatenate(all_boxes)[order], masks
+
+
+def extract_regions(mask):
+    """
+    Un seul passage d'étiquetage (8-connexité) sur le masque binaire.
+    Renvoie l'image d'étiquettes puis, pour chaque région hors fond (région i <-> étiquette i + 1),
+    les tableaux d'aires (en pixels), de boîtes englobantes (x, y, w, h) et de centroïdes.
+    """
+    _, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    return labels, stats[1:, cv2.CC_STAT_AREA], stats[1:, :cv2.CC_STAT_AREA], centroids[1:]
+
+
+def select_top_regions(areas, min_area, count):
+    """
+    Indices des `count` plus grandes régions d'aire > min_area, par aire décroissante.
+    Sélection partielle (argpartition) : seules les régions retenues sont triées.
+    S'il y a moins de `count` candidates, renvoie toutes les candidates.
+    """
+    candidates = np.flatnonzero(areas > min_area)
+    if len(candidates) > count:
+        candidates = candidates[np.argpartition(-areas[candidates], count - 1)[:count]]
+    return candidates[np.argsort(-areas[candidates], kind='stable')]
+
+
+class DebugImageWriter:
+    """
+    Écrit les images de débogage depuis un thread d'arrière-plan : l'encodage PNG et
+    l'écriture disque ne bloquent pas la détection. close() attend la fin des écritures.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="debug-image-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            path, image = item
+            try:
+                cv2.imwrite(path, image)
+            except cv2.error as e:
+                print(f"  -> Erreur d'écriture de {path}: {e}")
+
+    def submit(self, path, image):
+        # Les tableaux transmis ne sont plus modifiés par la chaîne de détection : pas de copie.
+        self._queue.put((path, image))
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+
+_debug_writer = None
+
+
+def get_debug_writer():
+    """
+    Writer partagé du processus, créé au premier besoin. Il est fermé automatiquement à la
+    sortie du processus (principal ou de travail) pour ne perdre aucune image en attente.
+    """
+    global _debug_writer
+    if _debug_writer is None:
+        _debug_writer = DebugImageWriter()
+        multiprocessing.util.Finalize(None, _debug_writer.close, exitpriority=10)
+    return _debug_writer
+
+
+def flush_debug_images():
+    global _debug_writer
+    if _debug_writer is not None:
+        _debug_writer.close()
+        _debug_writer = None
+
+
+def debug_requested(original_path, debug_levels):
+    """
+    Vrai si la paire correspond à l'un des noms ou motifs glob de debug_levels
+    (comparés au nom de niveau, ex. "level9" ou "level1*", et au nom de fichier).
+    """
+    if not debug_levels:
+        return False
+    filename = os.path.basename(original_path)
+    base_name = filename.split("_original")[0]
+    return any(fnmatch.fnmatch(base_name, pattern) or fnmatch.fnmatch(filename, pattern)
+               for pattern in debug_levels)
+
+
+def process_image_pair(original_path, modified_path, multiscale=False, decode_scale=1, stats=None,
+                       debug_levels=None):
+    """
+    Analyse une paire d'images avec une méthode robuste aux artefacts JPEG.
+
+    Avec multiscale=True, les candidats sont d'abord cherchés sur une version réduite
+    (voir _multiscale_regions) et seules leurs fenêtres sont traitées en pleine résolution.
+    Avec decode_scale (2, 4 ou 8), les images sont décodées directement à échelle réduite ;
+    les coordonnées renvoyées restent normalisées.
+    Avec stats (un DetectionStats), le temps de chaque étape et le nombre de régions
+    candidates avant / après le filtre d'aire sont enregistrés.
+    Avec debug_levels (noms ou motifs glob), les images intermédiaires des niveaux concernés
+    sont écrites dans debug_<niveau>/ par le DebugImageWriter d'arrière-plan.
+    """
+    stats = stats or _NO_STATS
+    gris_original, gris_modifie = load_gray_pair(original_path, modified_path, decode_scale, stats)
 
-    filtered_contours = [c for c in contours if cv2.contourArea(c) > MIN_CONTOUR_AREA]
-    sorted_contours = sorted(filtered_contours, key=cv2.contourArea, reverse=True)
-    
-    # Vérifier si le nombre de contours trouvés est inférieur à la cible
-    if len(sorted_contours) < NUM_DIFFERENCES_TARGET:
-        print(f"  -> Avertissement: Trouvé seulement {len(sorted_contours)}/{NUM_DIFFERENCES_TARGET} différences significatives pour {os.path.basename(original_path)}. Ces images ne seront pas incluses et seront déplacées.")
+    if gris_original is None or gris_modifie is None:
+        print(f"  -> Erreur: Impossible de charger {original_path} ou {modified_path}")
+        return []
+
+    hauteur, largeur = gris_original.shape
+    settings = pipeline_settings(decode_scale)
+
+    # --- Debugging ---
+    save_debug = None
+    if debug_requested(original_path, debug_levels):
+        level_name = os.path.basename(original_path).split("_original")[0]
+        debug_dir = os.path.join(os.path.dirname(original_path), f"debug_{level_name}")
+        os.makedirs(debug_dir, exist_ok=True)
+        print(f"  ---> DEBUGGING {level_name}: Saving intermediate images to {debug_dir}")
+        writer = get_debug_writer()
+
+        def save_debug(name, image):
+            writer.submit(os.path.join(debug_dir, f"{level_name}_{name}.png"), image)
+    # --- End Debugging ---
+
+    if save_debug:
+        save_debug("1_gris_original", gris_original)
+        save_debug("1_gris_modifie", gris_modifie)
+
+    labels = None
+    if multiscale:
+        regions = _multiscale_regions(gris_original, gris_modifie, settings, stats)
+        if regions is None:
+            print(f"  -> Avertissement: Moins de {NUM_DIFFERENCES_TARGET} régions candidates à l'échelle réduite pour {os.path.basename(original_path)}. Ces images ne seront pas incluses et seront déplacées.")
+            return None
+        areas, boxes, window_masks = regions
+        if save_debug:
+            thresh_dilated = np.zeros((hauteur, largeur), np.uint8)
+            for x0, y0, window in window_masks:
+                thresh_dilated[y0:y0 + window.shape[0], x0:x0 + window.shape[1]] = window
+            save_debug("6_thresh_dilated", thresh_dilated)
+            labels = extract_regions(thresh_dilated)[0]
+    else:
+        thresh_dilated = _difference_mask(gris_original, gris_modifie, settings, save_debug, stats=stats)
+        with stats.stage("contours"):
+            labels, areas, boxes, centroids = extract_regions(thresh_dilated)
+    with stats.stage("selection"):
+        top_regions = select_top_regions(areas, settings["min_contour_area"], NUM_DIFFERENCES_TARGET)
+    stats.count("candidates", len(areas))
+    stats.count("candidates_above_min_area", int((areas > settings["min_contour_area"]).sum()))
+
+    # Vérifier si le nombre de régions trouvées est inférieur à la cible
+    if len(top_regions) < NUM_DIFFERENCES_TARGET:
+        print(f"  -> Avertissement: Trouvé seulement {len(top_regions)}/{NUM_DIFFERENCES_TARGET} différences significatives pour {os.path.basename(original_path)}. Ces images ne seront pas incluses et seront déplacées.")
         return None # Indique que le nombre de différences est incorrect
 
-    # Si on arrive ici, on a au moins NUM_DIFFERENCES_TARGET contours. On prend les N meilleurs.
-    top_contours = sorted_contours[:NUM_DIFFERENCES_TARGET]
+    # --- Debugging: Draw detected regions ---
+    if save_debug:
+        # La couleur n'est décodée que pour ce dessin de débogage.
+        img_with_contours = cv2.imread(original_path, REDUCED_COLOR_FLAGS[decode_scale])
+        top_mask = np.isin(labels, top_regions + 1).astype(np.uint8)
+        top_contours, _ = cv2.findContours(top_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        cv2.drawContours(img_with_contours, top_contours, -1, (0, 255, 0), 3) # Draw in green
+        for s_px, s_py, s_pw, s_ph in boxes[top_regions]: # Draw bounding boxes too
+            cv2.rectangle(img_with_contours, (int(s_px), int(s_py)), (int(s_px + s_pw), int(s_py + s_ph)), (255, 0, 0), 2) # Blue rectangles
+        save_debug("7_contours_detected", img_with_contours)
+    # --- End Debugging ---
 
     difference_spots = []
-    # --- Debugging level9: Draw detected contours ---
-    if is_level9 and debug_dir:
-        img_with_contours = image_originale.copy()
-        cv2.drawContours(img_with_contours, top_contours, -1, (0, 255, 0), 3) # Draw in green
-        for spot_contour in top_contours: # Draw bounding boxes too
-            (s_px, s_py, s_pw, s_ph) = cv2.boundingRect(spot_contour)
-            cv2.rectangle(img_with_contours, (s_px, s_py), (s_px + s_pw, s_py + s_ph), (255, 0, 0), 2) # Blue rectangles
-        cv2.imwrite(os.path.join(debug_dir, "level9_7_contours_detected.png"), img_with_contours)
-    # --- End Debugging level9 ---
-
-    for contour in top_contours:
-        (px, py, pw, ph) = cv2.boundingRect(contour)
+    for px, py, pw, ph in boxes[top_regions]:
         center_x_px = px + pw / 2
         center_y_px = py + ph / 2
-        norm_x = round(center_x_px / largeur, 4)
-        norm_y = round(center_y_px / hauteur, 4)
+        norm_x = round(float(center_x_px) / largeur, 4)
+        norm_y = round(float(center_y_px) / hauteur, 4)
         norm_radius = DEFAULT_RADIUS_RATIO
         difference_spots.append({'x': norm_x, 'y': norm_y, 'radius': norm_radius})
 
@@ -130,164 +576,196 @@ def process_image_pair(original_path, modified_path):
     return difference_spots
 
 
+JSON_OUTPUT_FILE = os.path.normpath(os.path.join(IMAGES_DIRECTORY, "..", "..", "data", "find_the_differences", "level_data.json"))
+# Fichier produit par chaque backend d'export (--format)
+EXPORT_OUTPUT_FILES = {
+    "json": JSON_OUTPUT_FILE,
+    "binary": os.path.splitext(JSON_OUTPUT_FILE)[0] + ".bin",
+    "dart": DART_OUTPUT_FILE,
+}
+# Mode --watch : intervalle de relevé du dossier et durée de stabilité avant reconstruction (secondes)
+WATCH_POLL_INTERVAL = 0.5
+WATCH_DEBOUNCE_SECONDS = 2.0
+# Mode --shard-size : dossier des fichiers level_data_NNN.json et de leur index level_index.json
+SHARDS_DIRECTORY = os.path.join(os.path.dirname(JSON_OUTPUT_FILE), "shards")
+# Nombre de threads internes OpenCV par processus de travail (mode --jobs)
+OPENCV_THREADS_PER_JOB = 1
 
 
-''' 
+def _process_pair_job(job):
+    # Fonction de niveau module pour pouvoir être envoyée aux processus de travail.
+    # Renvoie les différences et, si demandé, les mesures de DetectionStats (sérialisables).
+    original_path, modified_path, options, with_stats = job
+    stats = DetectionStats(os.path.basename(original_path)) if with_stats else None
+    spots = process_image_pair(original_path, modified_path, stats=stats, **options)
+    return spots, stats.as_dict() if stats else None
 
-def generate_dart_code():
+
+def detection_params(**options):
     """
-    Fonction principale qui scanne les images et génère le fichier Dart.
+    Paramètres qui influencent le résultat de process_image_pair, y compris les options
+    passées à process_image_pair (ex. multiscale).
+    Toute modification de l'un d'eux invalide les entrées du cache.
     """
-    print("Démarrage du traitement des images...")
-    
-    # Le script va lister tous les fichiers, y compris lui-même, mais les filtres ne garderont que les images.
-    all_files = sorted(os.listdir(IMAGES_DIRECTORY))
-    image_pairs = []
-
-    for filename in all_files:
-        if "_original" in filename:
-            modified_filename = filename.replace("_original", "_modified")
-            if modified_filename in all_files:
-                image_pairs.append({
-                    "original": filename,
-                    "modified": modified_filename
-                })
-
-    if not image_pairs:
-        print(f"Erreur: Aucun couple d'images `_original` et `_modified` trouvé dans ce dossier.")
-        return
+    params = {
+        "num_differences_target": NUM_DIFFERENCES_TARGET,
+        "min_contour_area": MIN_CONTOUR_AREA,
+        "threshold_value": THRESHOLD_VALUE,
+        "blur_kernel_size": list(BLUR_KERNEL_SIZE),
+        "close_kernel_size": list(CLOSE_KERNEL_SIZE),
+        "dilate_kernel_size": list(DILATE_KERNEL_SIZE),
+        "default_radius_ratio": DEFAULT_RADIUS_RATIO,
+        "decode_scale": 1,
+    }
+    if options.get("multiscale"):
+        params["pyramid_levels"] = PYRAMID_LEVELS
+        # Réduction par maximum (exacte) : invalide les résultats de l'ancienne réduction pyrDown.
+        params["multiscale_coarse"] = "max_pool"
+        params["multiscale_max_coverage"] = MULTISCALE_MAX_COVERAGE
+    # Une option désactivée (False / None) donne la même clé que son absence.
+    params.update({name: value for name, value in options.items() if value is not None and value is not False})
+    return params
+
+
+def pair_cache_key(original_path, modified_path, params=None):
+    """
+    Clé de cache d'une paire : empreinte des deux fichiers et des paramètres de détection.
+    """
+    if params is None:
+        params = detection_params()
+    key = hashlib.sha256()
+    key.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+    key.update(file_digest(original_path).encode('ascii'))
+    key.update(file_digest(modified_path).encode('ascii'))
+    return key.hexdigest()
 
-    print(f"Trouvé {len(image_pairs)} paires d'images.")
-    
-    # Créer le dossier pour les images avec un nombre incorrect de différences s'il n'existe pas
-    os.makedirs(INVALID_IMAGES_FOLDER, exist_ok=True)
-    print(f"Les images avec moins de {NUM_DIFFERENCES_TARGET} différences seront déplacées vers: {INVALID_IMAGES_FOLDER}")
-    
-    all_levels_data_strings = []
-    level_id_counter = 1 # Ce compteur ne s'incrémentera que pour les niveaux valides
 
-    for pair in image_pairs:
-        base_name = pair['original'].split("_original")[0]
-        print(f"\nTraitement de la paire d'images pour '{base_name}'...") 
-        
-        original_full_path = os.path.join(IMAGES_DIRECTORY, pair['original'])
-        modified_full_path = os.path.join(IMAGES_DIRECTORY, pair['modified'])
-        
-        spots = process_image_pair(original_full_path, modified_full_path)
-
-        if spots is None: # Cas où le nombre de différences n'est pas NUM_DIFFERENCES_TARGET
-            print(f"  -> Déplacement des images pour {base_name} car le nombre de différences détectées n'est pas {NUM_DIFFERENCES_TARGET}.")
-            
-            dest_original_path = os.path.join(INVALID_IMAGES_FOLDER, pair['original'])
-            dest_modified_path = os.path.join(INVALID_IMAGES_FOLDER, pair['modified'])
-            
-            try:
-                if os.path.exists(original_full_path):
-                    shutil.move(original_full_path, dest_original_path)
-                
-                if os.path.exists(modified_full_path):
-                    shutil.move(modified_full_path, dest_modified_path)
-
-                moved_original = os.path.exists(dest_original_path) and not os.path.exists(original_full_path)
-                moved_modified = os.path.exists(dest_modified_path) and not os.path.exists(modified_full_path)
-
-                if moved_original or moved_modified :
-                     print(f"     Images pour {base_name} déplacées vers {INVALID_IMAGES_FOLDER}")
-                elif (os.path.exists(dest_original_path) or os.path.exists(dest_modified_path)) and \
-                     not (os.path.exists(original_full_path) or os.path.exists(modified_full_path)):
-                     print(f"     Images pour {base_name} semblent déjà déplacées ou sources supprimées.")
-                # else: # Commented out for brevity, can be enabled for detailed debugging
-                #      print(f"     Vérification du déplacement pour {base_name}: src_orig_exists={os.path.exists(original_full_path)}, src_mod_exists={os.path.exists(modified_full_path)}, dest_orig_exists={os.path.exists(dest_original_path)}, dest_mod_exists={os.path.exists(dest_modified_path)}")
+def process_image_pairs(image_pairs, jobs=1, cache_file=None, stats_records=None, **options):
+    """
+    Analyse toutes les paires et renvoie les résultats de process_image_pair
+    dans le même ordre que image_pairs, quel que soit le nombre de processus.
+    Aucun fichier n'est déplacé ici : c'est le rôle du processus principal.
 
-            except Exception as e:
-                print(f"     Erreur critique lors du déplacement des images {base_name}: {e}")
-            continue 
+    Avec cache_file, les paires dont les fichiers et les paramètres n'ont pas changé
+    sont reprises du cache sans passer par OpenCV (liste de différences ou rejet).
+    Le cache réécrit ne garde que les paires dont l'image existe encore et dont les paramètres
+    sont les paramètres courants, ce qui élimine les entrées des fichiers supprimés ou calculées
+    avec d'anciens paramètres.
 
-        if not spots: # Cas où process_image_pair retourne une liste vide (ex: erreur de chargement d'image)
-            print(f"  -> Aucune différence traitable trouvée pour {base_name} (ex: erreur chargement), couple ignoré.")
-            continue
-        
-        # Si on arrive ici, le niveau est valide. On peut maintenant utiliser level_id_counter.
-        print(f"  -> Niveau {level_id_counter} ({base_name}) validé avec {len(spots)} différences.")
-
-        diff_spots_strings = []
-        for i, spot in enumerate(spots):
-            spot_string = f"      DifferenceSpot(id: 'diff{i+1}', x: {spot['x']}, y: {spot['y']}, radius: {spot['radius']})"
-            diff_spots_strings.append(spot_string)
-
-        level_data_string = f"""  LevelData(
-    levelId: '{level_id_counter}',
-    imageOriginalPath: '{ASSETS_PATH_PREFIX}{pair['original']}',
-    imageModifiedPath: '{ASSETS_PATH_PREFIX}{pair['modified']}',
-    differences: [
-{',\n'.join(diff_spots_strings)},
-    ],
-    totalDifferences: {len(spots)},
-  )"""
-        
-        all_levels_data_strings.append(level_data_string)
-        level_id_counter += 1
+    Avec stats_records (une liste), une mesure DetectionStats.as_dict() est ajoutée pour
+    chaque paire réellement analysée (les paires reprises du cache n'en ont pas).
 
-    level_data_class_definition = """\nimport 'difference_spot.dart';
-
-class LevelData {
-  final String levelId;
-  final String imageOriginalPath;
-  final String imageModifiedPath;
-  final List<DifferenceSpot> differences;
-  final int timeLimitSeconds; // Default can be set here or in constructor
-  final int totalDifferences;
-
-  LevelData({
-    required this.levelId,
-    required this.imageOriginalPath,
-    required this.imageModifiedPath,
-    required this.differences,
-    this.timeLimitSeconds = 120, // Example default value
-    required this.totalDifferences,
-  });
-}
-"""
-
-    final_dart_content = f"// Fichier auto-généré le {__import__('datetime').datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-    final_dart_content += level_data_class_definition
-    final_dart_content += "\nfinal List<LevelData> levels = [\n"
-    if all_levels_data_strings:
-        final_dart_content += ",\n".join(all_levels_data_strings)
-        final_dart_content += ",\n"
-    final_dart_content += "];\n"
-
-    # S'assurer que le répertoire de sortie existe
-    output_dir = os.path.dirname(DART_OUTPUT_FILE)
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        print(f"Création du répertoire: {output_dir}")
-    
-    print("\n" + "="*50)
-    print("RÉSULTAT DU CODE DART GÉNÉRÉ")
-    print("="*50)
-    print(final_dart_content)
-    
-    with open(DART_OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        f.write(final_dart_content)
-        
-    print("\n" + "="*50)
-    print(f"✅ Le script a terminé. Le résultat a été exporté dans '{DART_OUTPUT_FILE}'.")
+    Les options supplémentaires (ex. multiscale=True) sont transmises à process_image_pair.
+    """
+    paths = [
+        (os.path.join(IMAGES_DIRECTORY, pair['original']), os.path.join(IMAGES_DIRECTORY, pair['modified']))
+        for pair in image_pairs
+    ]
+    results = [None] * len(paths)
+    todo = list(range(len(paths)))
+
+    if cache_file:
+        cached = load_json_cache(cache_file)
+        # Le débogage ne change pas les différences détectées : il n'entre pas dans la clé,
+        # mais les niveaux à déboguer sont toujours réanalysés pour produire leurs images.
+        debug_levels = options.get("debug_levels")
+        params = detection_params(**{k: v for k, v in options.items() if k != "debug_levels"})
+        keys = [pair_cache_key(o, m, params) for o, m in paths]
+        params_key = params_digest(params)
+        todo = []
+        for idx, pair in enumerate(image_pairs):
+            entry = cached.get(pair['original'])
+            if debug_requested(paths[idx][0], debug_levels):
+                todo.append(idx)
+            elif entry is not None and entry.get("key") == keys[idx]:
+                results[idx] = entry["spots"]
+            else:
+                todo.append(idx)
+        print(f"Cache : {len(paths) - len(todo)} paire(s) reprise(s), {len(todo)} à analyser.")
+
+    jobs_args = [(paths[idx][0], paths[idx][1], options, stats_records is not None) for idx in todo]
+    if jobs <= 1 or len(todo) <= 1:
+        computed = [_process_pair_job(job) for job in jobs_args]
+    else:
+        print(f"Analyse de {len(todo)} paires sur {jobs} processus...")
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(OPENCV_THREADS_PER_JOB,)) as executor:
+            # executor.map conserve l'ordre d'entrée, donc la numérotation des levelId reste déterministe.
+            computed = list(executor.map(_process_pair_job, jobs_args))
+    flush_debug_images()
+    for idx, (spots, stats) in zip(todo, computed):
+        results[idx] = spots
+        if stats_records is not None:
+            stats_records.append(stats)
+
+    if cache_file:
+        # Les paires hors de image_pairs (analyse partielle, ex. mode --watch) restent en cache
+        # tant que leur image existe et que leurs paramètres sont les paramètres courants.
+        entries = {
+            name: entry for name, entry in cached.items()
+            if entry.get("params") == params_key and os.path.exists(os.path.join(IMAGES_DIRECTORY, name))
+        }
+        for idx, pair in enumerate(image_pairs):
+            entries.pop(pair['original'], None)
+            # Une liste vide signale une erreur de chargement : on ne la garde pas en cache.
+            if results[idx] is None or results[idx]:
+                entries[pair['original']] = {"key": keys[idx], "params": params_key, "spots": results[idx]}
+        save_json_cache(cache_file, entries)
 
+    return results
 
-if __name__ == "__main__":
-    generate_dart_code()
 
-    '''
+def _percentiles(values):
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
 
 
+def write_stats_report(stats_records, report_file):
+    """
+    Écrit les mesures par paire dans report_file : CSV (une ligne par paire, une colonne par
+    étape et par compteur) si l'extension est .csv, sinon JSON avec les mesures par paire et,
+    pour chaque étape et chaque compteur, moyenne et percentiles (p50, p90, p99, max).
+    """
+    stages = [st for st in STATS_STAGES if any(st in r["timings"] for r in stats_records)]
+    counters = sorted({name for r in stats_records for name in r["counters"]})
+
+    os.makedirs(os.path.dirname(report_file) or ".", exist_ok=True)
+    if report_file.lower().endswith(".csv"):
+        with open(report_file, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["pair"] + [f"{st}_s" for st in stages] + ["total_s"] + counters)
+            for r in stats_records:
+                writer.writerow(
+                    [r["pair"]]
+                    + [f"{r['timings'].get(st, 0.0):.6f}" for st in stages]
+                    + [f"{sum(r['timings'].values()):.6f}"]
+                    + [r["counters"].get(name, "") for name in counters]
+                )
+        return
 
-JSON_OUTPUT_FILE = "/Users/spyridon/Documents/GitHub/isma-assets/data/find_the_differences/level_data.json"
+    aggregate = {"stages": {}, "counters": {}}
+    if stats_records:
+        for st in stages:
+            aggregate["stages"][st] = _percentiles([r["timings"].get(st, 0.0) for r in stats_records])
+        aggregate["stages"]["total"] = _percentiles([sum(r["timings"].values()) for r in stats_records])
+        for name in counters:
+            aggregate["counters"][name] = _percentiles(
+                [r["counters"][name] for r in stats_records if name in r["counters"]])
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump({"aggregate": aggregate, "pairs": stats_records}, f, indent=2)
 
-def generate_json_file():
-    print("Démarrage du traitement des images...")
 
-    all_files = sorted(os.listdir(IMAGES_DIRECTORY))
+def find_image_pairs(directory=IMAGES_DIRECTORY):
+    """
+    Liste triée des couples `_original` / `_modified` présents dans le dossier.
+    """
+    all_files = sorted(os.listdir(directory))
     image_pairs = []
 
     for filename in all_files:
@@ -298,28 +776,29 @@ def generate_json_file():
                     "original": filename,
                     "modified": modified_filename
                 })
+    return image_pairs
 
-    if not image_pairs:
-        print("Erreur: Aucun couple d'images `_original` et `_modified` trouvé.")
-        return
 
+def iter_levels(image_pairs, all_spots, verbose=True):
+    """
+    Produit les niveaux un à un (levelId numérotés dans l'ordre des paires valides)
+    et déplace les paires rejetées vers INVALID_IMAGES_FOLDER. Les déplacements ne se font
+    que dans le processus principal. verbose=False n'affiche que les déplacements et erreurs.
+    """
     os.makedirs(INVALID_IMAGES_FOLDER, exist_ok=True)
-    print(f"Les images invalides seront déplacées vers: {INVALID_IMAGES_FOLDER}")
 
-    all_levels = []
     level_id_counter = 1
 
-    for pair in image_pairs:
+    for pair, spots in zip(image_pairs, all_spots):
         base_name = pair['original'].split("_original")[0]
-        print(f"\nTraitement de '{base_name}'...")
+        if verbose:
+            print(f"\nTraitement de '{base_name}'...")
 
         original_full_path = os.path.join(IMAGES_DIRECTORY, pair['original'])
         modified_full_path = os.path.join(IMAGES_DIRECTORY, pair['modified'])
 
-        spots = process_image_pair(original_full_path, modified_full_path)
-
         if spots is None:
-            print(f"  -> Déplacement des images car différences insuffisantes.")
+            print(f"  -> Déplacement des images de '{base_name}' car différences insuffisantes.")
             try:
                 shutil.move(original_full_path, os.path.join(INVALID_IMAGES_FOLDER, pair['original']))
                 shutil.move(modified_full_path, os.path.join(INVALID_IMAGES_FOLDER, pair['modified']))
@@ -328,7 +807,8 @@ def generate_json_file():
             continue
 
         if not spots:
-            print(f"  -> Aucune différence détectée, niveau ignoré.")
+            if verbose:
+                print(f"  -> Aucune différence détectée, niveau ignoré.")
             continue
 
         level_data = {
@@ -347,42 +827,187 @@ def generate_json_file():
             ]
         }
 
-        all_levels.append(level_data)
-        print(f"  -> Niveau {level_id_counter} ajouté.")
+        yield level_data
+        if verbose:
+            print(f"  -> Niveau {level_id_counter} ajouté.")
         level_id_counter += 1
 
-    # Enregistrement du JSON
-    output_dir = os.path.dirname(JSON_OUTPUT_FILE)
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    with open(JSON_OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        f.write('[\n')
-        for idx, level in enumerate(all_levels):
-            f.write('  {\n')
-            f.write(f'    "levelId": "{level["levelId"]}",\n')
-            f.write(f'    "imageOriginalPath": "{level["imageOriginalPath"]}",\n')
-            f.write(f'    "imageModifiedPath": "{level["imageModifiedPath"]}",\n')
-            f.write(f'    "totalDifferences": {level["totalDifferences"]},\n')
-            f.write('    "differences": [\n')
-            for i, spot in enumerate(level["differences"]):
-                spot_line = f'      {{"id": "{spot["id"]}", "x": {spot["x"]}, "y": {spot["y"]}, "radius": {spot["radius"]}}}'
-                if i < len(level["differences"]) - 1:
-                    spot_line += ','
-                f.write(spot_line + '\n')
-            f.write('    ]\n')
-            f.write('  }')
-            if idx < len(all_levels) - 1:
-                f.write(',\n')
-            else:
-                f.write('\n')
-        f.write(']\n')
 
+def export_levels(levels, shard_size=None, export_format="json", output_file=None):
+    """
+    Écrit les niveaux avec le backend export_format (voir EXPORT_FORMATS) dans output_file
+    (par défaut EXPORT_OUTPUT_FILES[export_format]), ou avec shard_size des fichiers JSON de
+    shard_size niveaux dans SHARDS_DIRECTORY (ou shards/ à côté de output_file), écrits au
+    fil de l'eau, plus leur index. Renvoie le nombre de niveaux exportés.
+    """
+    if shard_size:
+        shards_directory = os.path.join(os.path.dirname(output_file), "shards") if output_file else SHARDS_DIRECTORY
+        writer = LevelShardWriter(shards_directory, shard_size)
+        for level in levels:
+            writer.add(level)
+        index = writer.close()
+        print(f"Shards exportés : {len(index['shards'])} fichier(s), index {writer.index_path}")
+        return index["totalLevels"]
+
+    all_levels = list(levels)
+    output_file = output_file or EXPORT_OUTPUT_FILES[export_format]
+    write_file_atomic(output_file, EXPORT_FORMATS[export_format](all_levels))
+    print(f"Fichier exporté : {output_file}")
+    return len(all_levels)
+
+
+def generate_json_file(jobs=1, use_cache=True, stats_report=None, shard_size=None, export_format="json",
+                       output_file=None, **options):
+    print("Démarrage du traitement des images...")
 
+    image_pairs = find_image_pairs()
 
+    if not image_pairs:
+        print("Erreur: Aucun couple d'images `_original` et `_modified` trouvé.")
+        return
+
+    print(f"Les images invalides seront déplacées vers: {INVALID_IMAGES_FOLDER}")
+
+    stats_records = [] if stats_report else None
+    all_spots = process_image_pairs(image_pairs, jobs=jobs,
+                                    cache_file=SPOTS_CACHE_FILE if use_cache else None,
+                                    stats_records=stats_records, **options)
+    if stats_report:
+        write_stats_report(stats_records, stats_report)
+        print(f"Mesures par étape exportées : {stats_report}")
+
+    # Enregistrement des niveaux
+    export_levels(iter_levels(image_pairs, all_spots), shard_size, export_format, output_file)
+
+    print(f"\n✅ Export {export_format} terminé.")
+
+
+def _directory_snapshot(directory=IMAGES_DIRECTORY):
+    # Signature (mtime, taille) de chaque image de paire : change dès qu'un fichier est ajouté,
+    # supprimé ou encore en cours de copie.
+    snapshot = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and ("_original" in entry.name or "_modified" in entry.name):
+                stat = entry.stat()
+                snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def _rebuild_watched_levels(snapshot, known_spots, last_content, jobs, use_cache, shard_size, export_format,
+                            output_file, options):
+    """
+    Une reconstruction du mode surveillance : réanalyse les paires dont la signature a changé
+    (known_spots est mis à jour sur place) et réexporte si le contenu diffère de last_content.
+    Renvoie le contenu JSON exporté.
+    """
+    image_pairs = find_image_pairs()
+    signatures = [(snapshot.get(p['original']), snapshot.get(p['modified'])) for p in image_pairs]
+    changed = [p for p, sig in zip(image_pairs, signatures)
+               if p['original'] not in known_spots or known_spots[p['original']][0] != sig]
+    if changed:
+        print(f"\n{len(changed)} paire(s) nouvelle(s) ou modifiée(s) : "
+              + ", ".join(p['original'] for p in changed))
+        changed_spots = process_image_pairs(changed, jobs=jobs,
+                                            cache_file=SPOTS_CACHE_FILE if use_cache else None,
+                                            **options)
+        changed_signatures = dict(zip((p['original'] for p in image_pairs), signatures))
+        for pair, spots in zip(changed, changed_spots):
+            known_spots[pair['original']] = (changed_signatures[pair['original']], spots)
+    present = {p['original'] for p in image_pairs}
+    for name in list(known_spots):
+        if name not in present:
+            del known_spots[name]
+
+    all_levels = list(iter_levels(image_pairs, [known_spots[p['original']][1] for p in image_pairs],
+                                  verbose=False))
+    content = format_levels_json(all_levels)
+    if content != last_content:
+        count = export_levels(all_levels, shard_size, export_format, output_file)
+        print(f"✅ {count} niveaux exportés.")
+    return content
+
+
+def watch_json_file(poll_interval=WATCH_POLL_INTERVAL, debounce=WATCH_DEBOUNCE_SECONDS, jobs=1,
+                    use_cache=True, shard_size=None, export_format="json", output_file=None, **options):
+    """
+    Mode surveillance : reconstruit level_data.json dès que des paires sont ajoutées ou modifiées.
+
+    Le dossier est relu toutes les poll_interval secondes ; on attend qu'il soit stable pendant
+    debounce secondes (les deux moitiés d'une paire sont souvent copiées l'une après l'autre)
+    avant de reconstruire. Seules les paires dont un fichier a changé sont réanalysées, les autres
+    gardent leurs différences en mémoire, et le JSON est remplacé de façon atomique.
+    """
+    print(f"Surveillance de {os.path.abspath(IMAGES_DIRECTORY)} (Ctrl+C pour arrêter)...")
+    known_spots = {}
+    last_snapshot = None
+    last_change = 0.0
+    built_snapshot = None
+    last_content = None
+
+    try:
+        while True:
+            try:
+                snapshot = _directory_snapshot()
+            except OSError as e:
+                # Fichier supprimé ou renommé pendant le relevé : on relira au prochain tour.
+                print(f"  -> Erreur de lecture du dossier ({e}), nouvel essai au prochain relevé.")
+                time.sleep(poll_interval)
+                continue
+            now = time.monotonic()
+            if snapshot != last_snapshot:
+                last_snapshot = snapshot
+                last_change = now
+            elif snapshot != built_snapshot and now - last_change >= debounce:
+                try:
+                    last_content = _rebuild_watched_levels(snapshot, known_spots, last_content, jobs, use_cache,
+                                                           shard_size, export_format, output_file, options)
+                except OSError as e:
+                    # Une paire a disparu ou été renommée pendant l'analyse : built_snapshot n'est
+                    # pas mis à jour, la reconstruction est retentée au prochain relevé.
+                    print(f"  -> Erreur pendant la reconstruction ({e}), nouvel essai au prochain relevé.")
+                else:
+                    # Si des paires rejetées viennent d'être déplacées, le prochain relevé diffère et
+                    # déclenche une reconstruction sans réanalyse (le JSON n'est réécrit que s'il change).
+                    built_snapshot = snapshot
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print("\nSurveillance arrêtée.")
 
-    print("\n✅ Export JSON terminé.")
-    print(f"Fichier exporté : {JSON_OUTPUT_FILE}")
 
 if __name__ == "__main__":
-    generate_json_file()
+    parser = argparse.ArgumentParser(description="Génère level_data.json à partir des paires d'images.")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Nombre de processus pour analyser les paires en parallèle (défaut : 1).")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore le cache des différences et réanalyse toutes les paires.")
+    parser.add_argument("--multiscale", action="store_true",
+                        help="Détection grossière sur une pyramide réduite puis affinage des seules fenêtres candidates.")
+    parser.add_argument("--decode-scale", type=int, choices=sorted(REDUCED_GRAYSCALE_FLAGS), default=1,
+                        help="Décode les images directement en niveaux de gris à 1/N de leur taille (défaut : 1).")
+    parser.add_argument("--stats-report", metavar="FICHIER",
+                        help="Exporte le temps de chaque étape et les compteurs par paire (JSON, ou CSV si .csv).")
+    parser.add_argument("--debug-levels", nargs="+", metavar="NIVEAU",
+                        help="Niveaux (noms ou motifs glob, ex. level9 'level1*') dont les images intermédiaires sont exportées.")
+    parser.add_argument("--watch", action="store_true",
+                        help="Reste actif et reconstruit le JSON dès qu'une paire est ajoutée ou modifiée.")
+    parser.add_argument("--shard-size", type=int, metavar="N",
+                        help="Découpe le catalogue en fichiers de N niveaux avec un index (level_index.json).")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="json", dest="export_format",
+                        help="Backend d'export : json (défaut), binary (float32 + table des niveaux) ou dart (littéraux const).")
+    parser.add_argument("--output", metavar="FICHIER",
+                        help="Fichier de sortie (défaut : data/find_the_differences/level_data.json du dépôt, "
+                             "ou l'équivalent .bin / .dart selon --format).")
+    args = parser.parse_args()
+    if args.shard_size and args.export_format != "json":
+        parser.error("--shard-size ne s'applique qu'au format json.")
+    if args.watch:
+        watch_json_file(jobs=args.jobs, use_cache=not args.no_cache, shard_size=args.shard_size,
+                        export_format=args.export_format, output_file=args.output,
+                        multiscale=args.multiscale, decode_scale=args.decode_scale,
+                        debug_levels=args.debug_levels)
+    else:
+        generate_json_file(jobs=args.jobs, use_cache=not args.no_cache, stats_report=args.stats_report,
+                           shard_size=args.shard_size, export_format=args.export_format, output_file=args.output,
+                           multiscale=args.multiscale, decode_scale=args.decode_scale,
+                           debug_levels=args.debug_levels)
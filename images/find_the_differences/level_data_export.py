@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import glob
+import struct
+import hashlib
+
+# Utilitaires de fichiers partagés avec les outils du dépôt (tools/asset_utils.py)
+TOOLS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "tools")
+if TOOLS_DIRECTORY not in sys.path:
+    sys.path.append(TOOLS_DIRECTORY)
+from asset_utils import write_file_atomic
+
+# --- CONFIGURATION ---
+# Nom des fichiers de shard (numérotés à partir de 1) et de leur index
+SHARD_FILE_PATTERN = "level_data_{index:03d}.json"
+SHARD_INDEX_FILE = "level_index.json"
+# Version du format de l'index, à incrémenter si sa structure change
+SHARD_INDEX_VERSION = 1
+# Format binaire (--format binary) : signature et version de l'en-tête
+BINARY_MAGIC = b"FTDL"
+BINARY_VERSION = 1
+
+
+def format_levels_json(all_levels):
+    """
+    Texte JSON des niveaux, une différence par ligne (format historique de level_data.json).
+    """
+    parts = ['[\n']
+    for idx, level in enumerate(all_levels):
+        parts.append('  {\n')
+        parts.append(f'    "levelId": "{level["levelId"]}",\n')
+        parts.append(f'    "imageOriginalPath": "{level["imageOriginalPath"]}",\n')
+        parts.append(f'    "imageModifiedPath": "{level["imageModifiedPath"]}",\n')
+        parts.append(f'    "totalDifferences": {level["totalDifferences"]},\n')
+        parts.append('    "differences": [\n')
+        for i, spot in enumerate(level["differences"]):
+            spot_line = f'      {{"id": "{spot["id"]}", "x": {spot["x"]}, "y": {spot["y"]}, "radius": {spot["radius"]}}}'
+            if i < len(level["differences"]) - 1:
+                spot_line += ','
+            parts.append(spot_line + '\n')
+        parts.append('    ]\n')
+        parts.append('  }')
+        if idx < len(all_levels) - 1:
+            parts.append(',\n')
+        else:
+            parts.append('\n')
+    parts.append(']\n')
+    return ''.join(parts)
+
+
+def _align4(size):
+    return (size + 3) & ~3
+
+
+def encode_levels_binary(all_levels):
+    """
+    Encodage binaire compact des niveaux (little-endian), lisible sans parseur JSON :
+
+        en-tête      : magic "FTDL", u16 version, u16 réservé, u32 nombre de niveaux N
+        table        : N x u32, position de chaque niveau depuis le début du fichier
+        niveau       : u32 levelId, u16 nombre de différences D,
+                       u16 + UTF-8 imageOriginalPath, u16 + UTF-8 imageModifiedPath,
+                       bourrage jusqu'au multiple de 4, puis D x (f32 x, f32 y, f32 radius)
+
+    Les id des différences ne sont pas stockés : ce sont toujours diff1..diffD.
+    """
+    records = []
+    for level in all_levels:
+        spots = level["differences"]
+        original = level["imageOriginalPath"].encode('utf-8')
+        modified = level["imageModifiedPath"].encode('utf-8')
+        record = bytearray(struct.pack("<IH", int(level["levelId"]), len(spots)))
+        for text in (original, modified):
+            record += struct.pack("<H", len(text)) + text
+        record += b"\0" * (_align4(len(record)) - len(record))
+        for spot in spots:
+            record += struct.pack("<3f", spot["x"], spot["y"], spot["radius"])
+        records.append(bytes(record))
+
+    header = struct.pack("<4sHHI", BINARY_MAGIC, BINARY_VERSION, 0, len(records))
+    offsets = []
+    position = len(header) + 4 * len(records)
+    for record in records:
+        offsets.append(position)
+        position += _align4(len(record))
+    parts = [header, struct.pack(f"<{len(offsets)}I", *offsets)]
+    for record in records:
+        parts.append(record + b"\0" * (_align4(len(record)) - len(record)))
+    return b"".join(parts)
+
+
+def decode_levels_binary(data):
+    """
+    Relit un fichier produit par encode_levels_binary (même modèle que le JSON,
+    coordonnées arrondies en float32). Sert de référence au lecteur côté application.
+    """
+    magic, version, _, count = struct.unpack_from("<4sHHI", data, 0)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError(f"Fichier de niveaux binaire invalide (signature {magic!r}, version {version}).")
+    offsets = struct.unpack_from(f"<{count}I", data, 12)
+    all_levels = []
+    for offset in offsets:
+        level_id, spot_count = struct.unpack_from("<IH", data, offset)
+        position = offset + 6
+        paths = []
+        for _ in range(2):
+            (length,) = struct.unpack_from("<H", data, position)
+            paths.append(data[position + 2:position + 2 + length].decode('utf-8'))
+            position += 2 + length
+        position = offset + _align4(position - offset)
+        values = struct.unpack_from(f"<{3 * spot_count}f", data, position)
+        all_levels.append({
+            "levelId": str(level_id),
+            "imageOriginalPath": paths[0],
+            "imageModifiedPath": paths[1],
+            "totalDifferences": spot_count,
+            "differences": [
+                {"id": f"diff{i+1}", "x": values[3 * i], "y": values[3 * i + 1], "radius": values[3 * i + 2]}
+                for i in range(spot_count)
+            ],
+        })
+    return all_levels
+
+
+DART_LEVEL_DATA_CLASS = """import 'difference_spot.dart';
+
+class LevelData {
+  final String levelId;
+  final String imageOriginalPath;
+  final String imageModifiedPath;
+  final List<DifferenceSpot> differences;
+  final int timeLimitSeconds;
+  final int totalDifferences;
+
+  const LevelData({
+    required this.levelId,
+    required this.imageOriginalPath,
+    required this.imageModifiedPath,
+    required this.differences,
+    this.timeLimitSeconds = 120,
+    required this.totalDifferences,
+  });
+}
+"""
+
+
+def format_levels_dart(all_levels):
+    """
+    Code Dart des niveaux sous forme de littéraux const : compilés dans l'application,
+    rien à parser au démarrage. DifferenceSpot doit avoir un constructeur const.
+    """
+    parts = ["// Fichier auto-généré par generate_level_data.py, ne pas modifier.\n", DART_LEVEL_DATA_CLASS,
+             "\nconst List<LevelData> levels = [\n"]
+    for level in all_levels:
+        parts.append("  LevelData(\n")
+        parts.append(f"    levelId: '{level['levelId']}',\n")
+        parts.append(f"    imageOriginalPath: '{level['imageOriginalPath']}',\n")
+        parts.append(f"    imageModifiedPath: '{level['imageModifiedPath']}',\n")
+        parts.append("    differences: [\n")
+        for spot in level["differences"]:
+            parts.append(f"      DifferenceSpot(id: '{spot['id']}', x: {spot['x']}, y: {spot['y']}, radius: {spot['radius']}),\n")
+        parts.append("    ],\n")
+        parts.append(f"    totalDifferences: {level['totalDifferences']},\n")
+        parts.append("  ),\n")
+    parts.append("];\n")
+    return "".join(parts)
+
+
+# Backends d'export : nom (--format) -> fonction d'encodage des niveaux
+EXPORT_FORMATS = {
+    "json": format_levels_json,
+    "binary": encode_levels_binary,
+    "dart": format_levels_dart,
+}
+
+
+class LevelShardWriter:
+    """
+    Écrit le catalogue par morceaux de shard_size niveaux au fur et à mesure que les niveaux
+    arrivent (add), sans garder plus d'un morceau en mémoire, puis l'index (close) :
+
+        {"version": 1, "shardSize": 25, "totalLevels": 51,
+         "shards": [{"file": "level_data_001.json", "firstLevelId": 1, "lastLevelId": 25,
+                     "count": 25, "sha256": "...", "bytes": 9876}, ...]}
+
+    Un shard dont le contenu n'a pas changé n'est pas réécrit (son empreinte reste valable
+    pour les caches de l'application). L'index est écrit en dernier, puis les shards en trop
+    d'une exécution précédente sont supprimés : l'index ne référence jamais un fichier absent.
+    """
+
+    def __init__(self, output_dir, shard_size):
+        if shard_size < 1:
+            raise ValueError(f"shard_size doit être >= 1 (reçu {shard_size}).")
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        self.index_path = os.path.join(output_dir, SHARD_INDEX_FILE)
+        self._pending = []
+        self._shards = []
+        self._total = 0
+
+    def add(self, level):
+        self._pending.append(level)
+        self._total += 1
+        if len(self._pending) >= self.shard_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        filename = SHARD_FILE_PATTERN.format(index=len(self._shards) + 1)
+        path = os.path.join(self.output_dir, filename)
+        content = format_levels_json(self._pending).encode('utf-8')
+        digest = hashlib.sha256(content).hexdigest()
+        if not _file_has_digest(path, digest):
+            write_file_atomic(path, content)
+        self._shards.append({
+            "file": filename,
+            "firstLevelId": int(self._pending[0]["levelId"]),
+            "lastLevelId": int(self._pending[-1]["levelId"]),
+            "count": len(self._pending),
+            "sha256": digest,
+            "bytes": len(content),
+        })
+        self._pending = []
+
+    def close(self):
+        self._flush()
+        index = {
+            "version": SHARD_INDEX_VERSION,
+            "shardSize": self.shard_size,
+            "totalLevels": self._total,
+            "shards": self._shards,
+        }
+        write_file_atomic(self.index_path, json.dumps(index, indent=2) + "\n")
+
+        current = {shard["file"] for shard in self._shards}
+        for path in glob.glob(os.path.join(self.output_dir, SHARD_FILE_PATTERN.replace("{index:03d}", "*"))):
+            if os.path.basename(path) not in current:
+                os.remove(path)
+        return index
+
+
+def _file_has_digest(path, digest):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest() == digest
+    except OSError:
+        return False
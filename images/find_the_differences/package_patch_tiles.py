@@ -0,0 +1,241 @@
+import cv2
+import numpy as np
+import os
+import re
+import json
+import shutil
+import argparse
+
+from generate_level_data import (
+    IMAGES_DIRECTORY,
+    ASSETS_PATH_PREFIX,
+    REDUCED_COLOR_FLAGS,
+    pipeline_settings,
+    _difference_mask,
+    find_image_pairs,
+)
+from level_data_export import write_file_atomic
+
+# --- CONFIGURATION ---
+# Dossier de sortie des tuiles et du manifeste (sous-dossier des images, donc sous ASSETS_PATH_PREFIX)
+PATCHES_DIRECTORY = os.path.join(IMAGES_DIRECTORY, "patches")
+PATCH_MANIFEST_FILE = "patch_manifest.json"
+# Côté de la grille sur laquelle les tuiles sont alignées (multiple de 8 : blocs JPEG)
+TILE_SIZE = 16
+# Marge ajoutée autour des différences avant l'alignement sur la grille (pixels)
+PATCH_MARGIN = 4
+# Les tuiles sont encodées sans perte (PNG) : recoller une tuile JPEG ajouterait une seconde
+# compression à l'intérieur même des différences.
+PATCH_EXTENSION = ".png"
+# Fichiers de tuiles : un dossier de niveau qui ne contient que ceux-ci peut être supprimé
+PATCH_FILE_PATTERN = re.compile(r"patch_\d+\.(png|jpg)$")
+# Au-delà de cette fraction de l'image couverte par les tuiles, on garde l'image modifiée entière
+MAX_PATCH_COVERAGE = 0.5
+# Version du format du manifeste
+PATCH_MANIFEST_VERSION = 1
+
+
+def load_color_pair(original_path, modified_path):
+    """
+    Décode les deux images en couleur ; la modifiée est ramenée aux dimensions de l'originale
+    (les tuiles sont placées dans le repère de l'originale).
+    """
+    original = cv2.imread(original_path, REDUCED_COLOR_FLAGS[1])
+    modified = cv2.imread(modified_path, REDUCED_COLOR_FLAGS[1])
+    if original is None or modified is None:
+        return None, None
+    if modified.shape != original.shape:
+        hauteur, largeur = original.shape[:2]
+        modified = cv2.resize(modified, (largeur, hauteur))
+    return original, modified
+
+
+def patch_mask(original, modified):
+    """
+    Masque des pixels à livrer : la chaîne du détecteur (_difference_mask) appliquée à chaque
+    canal B, G, R, pour ne pas manquer une différence de couleur à luminance égale,
+    puis élargie de PATCH_MARGIN pixels.
+    """
+    settings = pipeline_settings()
+    mask = np.zeros(original.shape[:2], np.uint8)
+    for channel in range(3):
+        np.maximum(mask, _difference_mask(original[:, :, channel], modified[:, :, channel], settings), out=mask)
+    if PATCH_MARGIN:
+        kernel = np.ones((2 * PATCH_MARGIN + 1, 2 * PATCH_MARGIN + 1), np.uint8)
+        mask = cv2.dilate(mask, kernel)
+    return mask
+
+
+def tile_rectangles(mask, tile_size=TILE_SIZE):
+    """
+    Rectangles (x, y, w, h) alignés sur une grille de tile_size pixels couvrant le masque :
+    une cellule est retenue si elle contient un pixel du masque, et chaque groupe de cellules
+    voisines (8-connexité) devient un rectangle, rogné aux bords de l'image.
+    """
+    hauteur, largeur = mask.shape
+    rows, cols = -(-hauteur // tile_size), -(-largeur // tile_size)
+    padded = np.zeros((rows * tile_size, cols * tile_size), np.uint8)
+    padded[:hauteur, :largeur] = mask
+    cells = (padded.reshape(rows, tile_size, cols, tile_size).max(axis=(1, 3)) > 0).astype(np.uint8)
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(cells, connectivity=8)
+    rectangles = []
+    for cx, cy, cw, ch, _ in stats[1:count]:
+        x, y = int(cx) * tile_size, int(cy) * tile_size
+        rectangles.append((x, y, min(int(cw) * tile_size, largeur - x), min(int(ch) * tile_size, hauteur - y)))
+    return rectangles
+
+
+def _encode_tile(image):
+    return cv2.imencode(PATCH_EXTENSION, image, [cv2.IMWRITE_PNG_COMPRESSION, 9])[1].tobytes()
+
+
+def patch_path_prefix(output_dir):
+    """
+    Préfixe des chemins de tuiles du manifeste : chemin d'asset de l'application si output_dir
+    est sous le dossier des images, sinon chemin relatif au manifeste lui-même.
+    """
+    relative = os.path.relpath(os.path.abspath(output_dir), IMAGES_DIRECTORY)
+    if relative == os.curdir:
+        return ASSETS_PATH_PREFIX
+    if relative.startswith(os.pardir):
+        return ""
+    return ASSETS_PATH_PREFIX + relative.replace(os.sep, "/") + "/"
+
+
+def remove_stale_levels(output_dir, kept_levels):
+    """
+    Supprime les dossiers de niveau de output_dir absents de kept_levels (paire supprimée,
+    rejetée ou désormais livrée entière), s'ils ne contiennent que des tuiles.
+    Renvoie les noms supprimés.
+    """
+    removed = []
+    for name in sorted(os.listdir(output_dir)):
+        path = os.path.join(output_dir, name)
+        if name in kept_levels or not os.path.isdir(path):
+            continue
+        if all(PATCH_FILE_PATTERN.match(filename) for filename in os.listdir(path)):
+            shutil.rmtree(path)
+            removed.append(name)
+    return removed
+
+
+def composite(original, tiles):
+    """
+    Reconstitue la vue modifiée comme le fera l'application : l'originale, puis chaque tuile
+    (image, x, y) collée à sa place.
+    """
+    result = original.copy()
+    for image, x, y in tiles:
+        h, w = image.shape[:2]
+        result[y:y + h, x:x + w] = image
+    return result
+
+
+def package_pair(pair, output_dir=PATCHES_DIRECTORY):
+    """
+    Découpe l'image modifiée d'une paire en tuiles couvrant seulement ses différences.
+    Renvoie l'entrée du manifeste, ou None si l'image ne peut pas être chargée ou si les
+    tuiles couvriraient plus de MAX_PATCH_COVERAGE de l'image (on livre alors la modifiée entière).
+    """
+    original_path = os.path.join(IMAGES_DIRECTORY, pair['original'])
+    modified_path = os.path.join(IMAGES_DIRECTORY, pair['modified'])
+    original, modified = load_color_pair(original_path, modified_path)
+    if original is None:
+        print(f"  -> Erreur: Impossible de charger {original_path} ou {modified_path}")
+        return None
+
+    hauteur, largeur = original.shape[:2]
+    rectangles = tile_rectangles(patch_mask(original, modified))
+    coverage = sum(w * h for _, _, w, h in rectangles) / float(largeur * hauteur)
+    if coverage > MAX_PATCH_COVERAGE:
+        print(f"  -> {pair['modified']} : tuiles sur {coverage:.0%} de l'image, image modifiée conservée.")
+        return None
+
+    base_name = pair['original'].split("_original")[0]
+    path_prefix = patch_path_prefix(output_dir)
+    level_dir = os.path.join(output_dir, base_name)
+    os.makedirs(level_dir, exist_ok=True)
+    for stale in os.listdir(level_dir):
+        os.remove(os.path.join(level_dir, stale))
+
+    patches, decoded, patch_bytes = [], [], 0
+    for i, (x, y, w, h) in enumerate(rectangles):
+        filename = f"patch_{i:02d}{PATCH_EXTENSION}"
+        content = _encode_tile(modified[y:y + h, x:x + w])
+        write_file_atomic(os.path.join(level_dir, filename), content)
+        patch_bytes += len(content)
+        decoded.append((cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_COLOR), x, y))
+        patches.append({
+            "file": f"{path_prefix}{base_name}/{filename}",
+            "x": x, "y": y, "width": w, "height": h,
+        })
+
+    # Contrôle : écart entre la vue reconstituée et l'image modifiée. Les tuiles étant sans perte,
+    # il ne vient que des pixels hors tuiles où l'originale et la modifiée diffèrent encore
+    # (bruit de compression des sources, sous le seuil du détecteur).
+    psnr = cv2.PSNR(composite(original, decoded), modified)
+    modified_bytes = os.path.getsize(modified_path)
+    print(f"  -> {pair['modified']} : {len(patches)} tuile(s), {coverage:.1%} de l'image, "
+          f"{patch_bytes / 1024:.0f} Ko au lieu de {modified_bytes / 1024:.0f} Ko (PSNR {psnr:.1f} dB).")
+    return {
+        "imageOriginalPath": ASSETS_PATH_PREFIX + pair['original'],
+        "imageModifiedPath": ASSETS_PATH_PREFIX + pair['modified'],
+        "width": largeur,
+        "height": hauteur,
+        "patches": patches,
+        "bytes": {"modified": modified_bytes, "patches": patch_bytes},
+        "psnr": round(float(psnr), 2),
+    }
+
+
+def package_patch_tiles(output_dir=PATCHES_DIRECTORY):
+    """
+    Produit les tuiles de toutes les paires et le manifeste patch_manifest.json :
+
+        {"version": 1, "tileSize": 16,
+         "levels": [{"imageOriginalPath": ..., "imageModifiedPath": ..., "width": 900, "height": 1273,
+                     "patches": [{"file": ..., "x": 64, "y": 128, "width": 48, "height": 32}, ...],
+                     ...}, ...]}
+
+    L'application affiche imageOriginalPath puis colle chaque tuile en (x, y), en pixels de
+    l'originale. Une paire absente du manifeste se charge comme avant (imageModifiedPath).
+    Les chemins des tuiles suivent output_dir (voir patch_path_prefix), et les dossiers de
+    niveaux qui ne sont plus dans le manifeste sont supprimés.
+    """
+    image_pairs = find_image_pairs()
+    if not image_pairs:
+        print("Erreur: Aucun couple d'images `_original` et `_modified` trouvé.")
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+    levels, kept_levels = [], set()
+    for pair in image_pairs:
+        base_name = pair['original'].split('_original')[0]
+        print(f"\nTraitement de '{base_name}'...")
+        entry = package_pair(pair, output_dir)
+        if entry is not None:
+            levels.append(entry)
+            kept_levels.add(base_name)
+
+    manifest = {"version": PATCH_MANIFEST_VERSION, "tileSize": TILE_SIZE, "levels": levels}
+    manifest_path = os.path.join(output_dir, PATCH_MANIFEST_FILE)
+    write_file_atomic(manifest_path, json.dumps(manifest, indent=2) + "\n")
+    removed = remove_stale_levels(output_dir, kept_levels)
+    if removed:
+        print(f"Dossiers de tuiles obsolètes supprimés : {', '.join(removed)}")
+
+    modified_total = sum(level["bytes"]["modified"] for level in levels)
+    patch_total = sum(level["bytes"]["patches"] for level in levels)
+    print(f"\n{len(levels)}/{len(image_pairs)} paires découpées : "
+          f"{patch_total / 2 ** 20:.1f} Mo de tuiles au lieu de {modified_total / 2 ** 20:.1f} Mo d'images modifiées.")
+    print(f"✅ Manifeste exporté : {manifest_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Remplace chaque image _modified par des tuiles couvrant seulement ses différences.")
+    parser.add_argument("--output", default=PATCHES_DIRECTORY,
+                        help="Dossier des tuiles et du manifeste (défaut : patches/ à côté des images).")
+    args = parser.parse_args()
+    package_patch_tiles(args.output)
@@ -0,0 +1,167 @@
+import os
+import json
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+from generate_level_data import (
+    IMAGES_DIRECTORY,
+    NUM_DIFFERENCES_TARGET,
+    BLUR_KERNEL_SIZE,
+    THRESHOLD_VALUE,
+    CLOSE_KERNEL_SIZE,
+    DILATE_KERNEL_SIZE,
+    MIN_CONTOUR_AREA,
+    REDUCED_GRAYSCALE_FLAGS,
+    OPENCV_THREADS_PER_JOB,
+    _difference_mask,
+    extract_regions,
+    find_image_pairs,
+    load_gray_pair,
+    pipeline_settings,
+    stage_keys,
+    init_worker,
+)
+
+# --- CONFIGURATION ---
+# Rapport JSON du balayage (par paire et global)
+SWEEP_REPORT_FILE = os.path.join(IMAGES_DIRECTORY, ".venv", "sweep_report.json")
+# Nombre de meilleures combinaisons affichées en fin de balayage
+TOP_POINTS_SHOWN = 10
+# Ordre des paramètres dans la grille : du plus en amont au plus en aval de la chaîne,
+# pour que les points consécutifs partagent le plus d'étapes mémorisées.
+GRID_PARAMETERS = ("blur", "threshold", "close", "dilate", "min_area")
+
+
+def build_grid(blur_sizes, thresholds, close_sizes, dilate_sizes, min_areas):
+    """
+    Produit cartésien des valeurs à tester, sous forme de dicts (noyaux carrés).
+    """
+    grid = []
+    for values in itertools.product(blur_sizes, thresholds, close_sizes, dilate_sizes, min_areas):
+        grid.append(dict(zip(GRID_PARAMETERS, values)))
+    return grid
+
+
+def _point_settings(point, decode_scale):
+    return pipeline_settings(
+        decode_scale,
+        blur_kernel_size=(point["blur"], point["blur"]),
+        threshold_value=point["threshold"],
+        close_kernel_size=(point["close"], point["close"]),
+        dilate_kernel_size=(point["dilate"], point["dilate"]),
+        min_contour_area=point["min_area"],
+    )
+
+
+def sweep_pair(original_path, modified_path, grid, decode_scale=1):
+    """
+    Nombre de différences détectées par une paire pour chaque point de la grille.
+
+    La paire n'est décodée qu'une fois ; les étapes de _difference_mask et l'étiquetage
+    sont mémorisés, donc seules les étapes dont les paramètres changent sont recalculées.
+    Renvoie None si la paire ne peut pas être chargée.
+    """
+    gris_original, gris_modifie = load_gray_pair(original_path, modified_path, decode_scale)
+    if gris_original is None or gris_modifie is None:
+        return None
+
+    memo = {}
+    region_areas = {}
+    counts = []
+    for point in grid:
+        settings = _point_settings(point, decode_scale)
+        mask_key = stage_keys(settings)["dilate"]
+        if mask_key not in region_areas:
+            mask = _difference_mask(gris_original, gris_modifie, settings, memo=memo)
+            region_areas[mask_key] = extract_regions(mask)[1]
+        counts.append(int((region_areas[mask_key] > settings["min_contour_area"]).sum()))
+    return counts
+
+
+def _sweep_pair_job(job):
+    original_path, modified_path, grid, decode_scale = job
+    return sweep_pair(original_path, modified_path, grid, decode_scale)
+
+
+def run_sweep(grid, jobs=1, decode_scale=1, images_directory=IMAGES_DIRECTORY):
+    """
+    Balaye toute la grille sur toutes les paires du dossier et renvoie le rapport :
+    nombre de différences par paire et par point, et pour chaque point le nombre de paires
+    qui donnent exactement NUM_DIFFERENCES_TARGET différences.
+    """
+    image_pairs = find_image_pairs(images_directory)
+    job_args = [
+        (os.path.join(images_directory, pair['original']), os.path.join(images_directory, pair['modified']),
+         grid, decode_scale)
+        for pair in image_pairs
+    ]
+    if jobs <= 1 or len(job_args) <= 1:
+        all_counts = [_sweep_pair_job(job) for job in job_args]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(OPENCV_THREADS_PER_JOB,)) as executor:
+            all_counts = list(executor.map(_sweep_pair_job, job_args))
+
+    pairs_report = []
+    points_report = [dict(point, exact=0, at_least=0) for point in grid]
+    for pair, counts in zip(image_pairs, all_counts):
+        pairs_report.append({"original": pair['original'], "counts": counts})
+        if counts is None:
+            print(f"  -> Erreur: Impossible de charger {pair['original']} ou {pair['modified']}")
+            continue
+        for point_report, count in zip(points_report, counts):
+            point_report["exact"] += count == NUM_DIFFERENCES_TARGET
+            point_report["at_least"] += count >= NUM_DIFFERENCES_TARGET
+
+    return {
+        "target": NUM_DIFFERENCES_TARGET,
+        "decode_scale": decode_scale,
+        "pairs_total": len(image_pairs),
+        "points": points_report,
+        "pairs": pairs_report,
+    }
+
+
+def print_sweep_summary(report):
+    ranked = sorted(report["points"], key=lambda p: (p["exact"], p["at_least"]), reverse=True)
+    print(f"\n{report['pairs_total']} paires, cible = {report['target']} différences.")
+    print("flou  seuil  fermeture  dilatation  aire_min  exact  >=cible")
+    for point in ranked[:TOP_POINTS_SHOWN]:
+        print(f"{point['blur']:>4}  {point['threshold']:>5}  {point['close']:>9}  {point['dilate']:>10}  "
+              f"{point['min_area']:>8g}  {point['exact']:>5}  {point['at_least']:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Balaye une grille de paramètres de détection et compte les paires qui donnent exactement la cible.")
+    parser.add_argument("--blur", type=int, nargs="+", default=[BLUR_KERNEL_SIZE[0]],
+                        help="Tailles (impaires) du noyau de flou gaussien.")
+    parser.add_argument("--threshold", type=int, nargs="+", default=[THRESHOLD_VALUE],
+                        help="Valeurs du seuil appliqué à la différence absolue.")
+    parser.add_argument("--close", type=int, nargs="+", default=[CLOSE_KERNEL_SIZE[0]],
+                        help="Tailles du noyau de fermeture.")
+    parser.add_argument("--dilate", type=int, nargs="+", default=[DILATE_KERNEL_SIZE[0]],
+                        help="Tailles du noyau de dilatation.")
+    parser.add_argument("--min-area", type=float, nargs="+", default=[MIN_CONTOUR_AREA],
+                        help="Aires minimales d'une différence (en pixels pleine résolution).")
+    parser.add_argument("--decode-scale", type=int, choices=sorted(REDUCED_GRAYSCALE_FLAGS), default=1,
+                        help="Décode les images à 1/N de leur taille (défaut : 1).")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Nombre de processus (une paire par tâche).")
+    parser.add_argument("--report", default=SWEEP_REPORT_FILE,
+                        help="Fichier JSON du rapport détaillé.")
+    args = parser.parse_args()
+
+    if any(k % 2 == 0 for k in args.blur):
+        parser.error("--blur : les tailles de noyau gaussien doivent être impaires.")
+
+    sweep_grid = build_grid(args.blur, args.threshold, args.close, args.dilate, args.min_area)
+    print(f"Balayage de {len(sweep_grid)} combinaisons de paramètres...")
+    sweep_report = run_sweep(sweep_grid, jobs=args.jobs, decode_scale=args.decode_scale)
+
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(sweep_report, f, indent=2)
+
+    print_sweep_summary(sweep_report)
+    print(f"\n✅ Rapport exporté : {args.report}")
@@ -0,0 +1,147 @@
+import os
+import json
+import fnmatch
+import hashlib
+
+import cv2
+
+# --- CONFIGURATION ---
+# Racine du dépôt : les outils se lancent depuis n'importe quel dossier
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGES_ROOT = os.path.join(REPO_ROOT, "images")
+DATA_ROOT = os.path.join(REPO_ROOT, "data")
+# Dossier de travail non versionné (caches, rapports)
+WORK_DIRECTORY = os.path.join(REPO_ROOT, ".venv")
+# Préfixe des URL publiques des fichiers du dépôt dans les catalogues (data/*/*.json)
+REMOTE_BASE_URL = "https://raw.githubusercontent.com/SpyrosKy/isma-assets/main/"
+# Extensions des images sources prises en compte
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+# Dossiers d'images servis à l'application
+ASSET_DIRECTORIES = ("find_the_differences", "puzzle_game", "oracle", "oracled")
+# Sorties générées rangées parmi les images (motifs de dossiers relatifs à IMAGES_ROOT) :
+# images de débogage de generate_level_data, jamais livrées à l'application...
+DEBUG_IMAGE_DIRECTORIES = ("find_the_differences/debug_*",)
+# ... puis tuiles de package_patch_tiles, masques et contours de generate_coloring_images (livrés)
+GENERATED_IMAGE_DIRECTORIES = DEBUG_IMAGE_DIRECTORIES + ("find_the_differences/patches", "coloring_book/output")
+
+
+def file_digest(path):
+    """
+    SHA-256 du contenu du fichier (lecture par blocs).
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def params_digest(params):
+    # Empreinte stable d'un dict de paramètres (ordre des clés indifférent).
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def load_json_cache(cache_file):
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_json_cache(cache_file, entries):
+    write_file_atomic(cache_file, json.dumps(entries, indent=2))
+
+
+def write_file_atomic(path, content):
+    """
+    Écrit dans un fichier temporaire du même dossier puis le renomme : un lecteur voit
+    toujours l'ancien fichier complet ou le nouveau, jamais un fichier à moitié écrit.
+    """
+    output_dir = os.path.dirname(path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    mode = 'wb' if isinstance(content, bytes) else 'w'
+    with open(tmp_path, mode, **({} if mode == 'wb' else {"encoding": "utf-8"})) as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def repo_relative(path):
+    # Chemin relatif à la racine du dépôt, avec des « / » (forme utilisée dans les URL).
+    return os.path.relpath(os.path.abspath(path), REPO_ROOT).replace(os.sep, "/")
+
+
+def remote_url(path):
+    return REMOTE_BASE_URL + repo_relative(path)
+
+
+def is_generated(path, patterns=GENERATED_IMAGE_DIRECTORIES):
+    """
+    True si path (fichier ou dossier, absolu ou relatif au dépôt) est l'un des dossiers
+    d'images générées de patterns ou se trouve dessous.
+    """
+    relative = os.path.relpath(os.path.join(REPO_ROOT, path), IMAGES_ROOT).replace(os.sep, "/")
+    parts = relative.split("/")
+    return any(fnmatch.fnmatch("/".join(parts[:i]), pattern)
+               for i in range(1, len(parts) + 1) for pattern in patterns)
+
+
+def iter_images(directories=ASSET_DIRECTORIES):
+    """
+    Chemins triés des images sources des dossiers (noms relatifs à IMAGES_ROOT),
+    sous-dossiers compris, hors dossiers cachés (.venv...) et hors sorties générées
+    (GENERATED_IMAGE_DIRECTORIES).
+    """
+    for directory in directories:
+        root_dir = os.path.join(IMAGES_ROOT, directory)
+        for root, dirs, files in os.walk(root_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith(".") and not is_generated(os.path.join(root, d)))
+            for filename in sorted(files):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(root, filename)
+
+
+def iter_catalogs():
+    """
+    Chemins triés des catalogues JSON de data/.
+    """
+    for root, dirs, files in os.walk(DATA_ROOT):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.endswith(".json"):
+                yield os.path.join(root, filename)
+
+
+def rewrite_catalog_urls(url_mapping, catalogs=None):
+    """
+    Remplace dans les catalogues chaque URL de url_mapping par sa nouvelle valeur.
+    Le remplacement est textuel (URL entre guillemets) pour garder la mise en forme
+    des fichiers ; un catalogue n'est réécrit que s'il change. Renvoie {catalogue: nb d'URL}.
+    """
+    changed = {}
+    for catalog in catalogs if catalogs is not None else iter_catalogs():
+        with open(catalog, 'r', encoding='utf-8') as f:
+            text = f.read()
+        updated, count = text, 0
+        for old_url, new_url in url_mapping.items():
+            quoted = f'"{old_url}"'
+            if quoted in updated:
+                count += updated.count(quoted)
+                updated = updated.replace(quoted, f'"{new_url}"')
+        if count:
+            write_file_atomic(catalog, updated)
+            changed[catalog] = count
+    return changed
+
+
+def init_worker(opencv_threads=1):
+    """
+    Initialise un processus de travail (initializer de ProcessPoolExecutor) : on limite les
+    threads internes d'OpenCV pour ne pas surcharger la machine quand plusieurs images
+    tournent en parallèle.
+    """
+    cv2.setNumThreads(opencv_threads)
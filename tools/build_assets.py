@@ -0,0 +1,240 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from asset_utils import (
+    REPO_ROOT,
+    WORK_DIRECTORY,
+    IMAGE_EXTENSIONS,
+    params_digest,
+    load_json_cache,
+    save_json_cache,
+    repo_relative,
+)
+
+# --- CONFIGURATION ---
+FIND_THE_DIFFERENCES_DIR = os.path.join(REPO_ROOT, "images", "find_the_differences")
+COLORING_BOOK_DIR = os.path.join(REPO_ROOT, "images", "coloring_book")
+LEVEL_DATA_FILE = os.path.join(REPO_ROOT, "data", "find_the_differences", "level_data.json")
+# Nombre de tâches lancées en même temps par défaut
+DEFAULT_JOBS = os.cpu_count() or 1
+# Empreinte de la liste des entrées de chaque tâche à son dernier build réussi : tâche -> sha256
+BUILD_STAMPS_FILE = os.path.join(WORK_DIRECTORY, "build_stamps.json")
+
+
+class Task:
+    """
+    Une sortie du build : commande (script Python lancé dans son dossier), entrées déclarées
+    (motifs glob relatifs à la racine du dépôt) et sorties (motifs, ou fonction des entrées).
+    Les sorties des tâches dont elle dépend (deps) comptent aussi comme entrées.
+    """
+
+    def __init__(self, name, script, inputs, outputs, args=(), deps=()):
+        self.name = name
+        self.script = script
+        self.inputs = [script] + list(inputs)
+        self.outputs = outputs
+        self.args = list(args)
+        self.deps = list(deps)
+
+    def input_files(self, tasks):
+        files = set()
+        for pattern in self.inputs:
+            files.update(glob.glob(os.path.join(REPO_ROOT, pattern), recursive=True))
+        for dep in self.deps:
+            files.update(tasks[dep].output_files(tasks))
+        # Les caches de compilation Python (créés en lançant les scripts) ne sont pas des entrées.
+        return sorted(f for f in files if os.path.isfile(f) and "__pycache__" not in f.split(os.sep))
+
+    def output_files(self, tasks):
+        if callable(self.outputs):
+            return sorted(self.outputs(self.input_files(tasks)))
+        return sorted(os.path.join(REPO_ROOT, pattern) for pattern in self.outputs)
+
+    def stamp(self, tasks):
+        """
+        Empreinte de la liste triée des entrées et des arguments : elle change quand une entrée
+        est ajoutée ou supprimée, ce que les dates de modification ne montrent pas.
+        """
+        return params_digest({"inputs": [repo_relative(path) for path in self.input_files(tasks)],
+                              "args": self.args})
+
+    def outdated_reason(self, tasks, stamps=None):
+        """
+        Raison de reconstruire (à la make), ou None si la tâche est à jour : une sortie manque,
+        la liste des entrées a changé depuis le dernier build réussi (stamps : {tâche: stamp}),
+        ou une entrée est plus récente que la plus ancienne des sorties.
+        """
+        outputs = self.output_files(tasks)
+        missing = [path for path in outputs if not os.path.exists(path)]
+        if missing or not outputs:
+            return f"sortie absente : {repo_relative(missing[0])}" if missing else "aucune sortie déclarée"
+        if stamps is not None and stamps.get(self.name) != self.stamp(tasks):
+            return "entrées ajoutées ou supprimées" if self.name in stamps else "aucun build enregistré"
+        oldest_output = min(os.path.getmtime(path) for path in outputs)
+        for path in self.input_files(tasks):
+            if os.path.getmtime(path) > oldest_output:
+                return f"entrée modifiée : {repo_relative(path)}"
+        return None
+
+    def run(self):
+        script_path = os.path.join(REPO_ROOT, self.script)
+        return subprocess.run([sys.executable, script_path] + self.args, cwd=os.path.dirname(script_path),
+                              capture_output=True, text=True)
+
+
+def _coloring_outputs(input_files):
+    outputs = [os.path.join(COLORING_BOOK_DIR, "output", "coloring_manifest.json")]
+    for path in input_files:
+        if path.lower().endswith(IMAGE_EXTENSIONS):
+            base_name = os.path.splitext(os.path.basename(path))[0]
+            outputs.append(os.path.join(COLORING_BOOK_DIR, "output", f"mask_{base_name}.png"))
+            outputs.append(os.path.join(COLORING_BOOK_DIR, "output", f"outline_{base_name}.png"))
+    return outputs
+
+
+def _level_image_patterns():
+    return [f"images/find_the_differences/*_{kind}{extension}"
+            for kind in ("original", "modified")
+            for extension in IMAGE_EXTENSIONS + tuple(e.upper() for e in IMAGE_EXTENSIONS)]
+
+
+def build_tasks():
+    tasks = [
+        Task("test_fixtures", "images/coloring_book/generate_test_images.py",
+             inputs=[],
+             outputs=[f"images/coloring_book/output/{kind}_{name}.{extension}"
+                      for name in ("flower", "butterfly", "cat")
+                      for kind, extension in (("outline", "png"), ("mask", "png"), ("palette", "json"))]),
+        Task("coloring_pages", "images/coloring_book/generate_coloring_images.py",
+             inputs=["images/coloring_book/input/*"],
+             outputs=_coloring_outputs),
+        Task("level_data", "images/find_the_differences/generate_level_data.py",
+             inputs=["images/find_the_differences/level_data_export.py", "tools/asset_utils.py"]
+             + _level_image_patterns(),
+             outputs=[repo_relative(LEVEL_DATA_FILE)],
+             args=["--output", LEVEL_DATA_FILE]),
+        # Après level_data : les paires rejetées ont été déplacées hors du dossier.
+        Task("patch_tiles", "images/find_the_differences/package_patch_tiles.py",
+             inputs=_level_image_patterns(),
+             outputs=["images/find_the_differences/patches/patch_manifest.json"],
+             deps=["level_data"]),
+        Task("asset_manifest", "tools/build_manifest.py",
+             inputs=["tools/asset_utils.py", "images/**/*", "data/**/*"],
+             outputs=["asset_manifest.json"],
+             deps=["test_fixtures", "coloring_pages", "level_data", "patch_tiles"]),
+    ]
+    return {task.name: task for task in tasks}
+
+
+def _with_dependencies(tasks, names):
+    selected, stack = set(), list(names)
+    while stack:
+        name = stack.pop()
+        if name not in selected:
+            selected.add(name)
+            stack.extend(tasks[name].deps)
+    return selected
+
+
+def build(names=None, jobs=DEFAULT_JOBS, force=False, dry_run=False, stamps_file=BUILD_STAMPS_FILE):
+    """
+    Reconstruit les tâches demandées (toutes par défaut) et leurs dépendances, en lançant
+    en parallèle (jobs à la fois) celles dont les dépendances sont terminées. Une tâche à jour
+    n'est pas relancée ; une tâche dont une dépendance a échoué est abandonnée.
+    Le stamp de chaque tâche reconstruite est enregistré dans stamps_file (sauf en dry_run).
+    Renvoie {tâche: "built" | "up-to-date" | "failed" | "skipped"}.
+    """
+    tasks = build_tasks()
+    stamps = load_json_cache(stamps_file)
+    selected = _with_dependencies(tasks, names or list(tasks))
+    status = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        while len(status) < len(selected):
+            for name in sorted(selected):
+                if name in status or name in running.values():
+                    continue
+                task = tasks[name]
+                if any(status.get(dep) in ("failed", "skipped") for dep in task.deps):
+                    status[name] = "skipped"
+                    print(f"⏭  {name} : dépendance en échec")
+                    continue
+                if not all(dep in status for dep in task.deps):
+                    continue
+                if force:
+                    reason = "--force"
+                elif dry_run and any(status[dep] == "built" for dep in task.deps):
+                    reason = "dépendance reconstruite"
+                else:
+                    reason = task.outdated_reason(tasks, stamps)
+                if reason is None:
+                    status[name] = "up-to-date"
+                    print(f"✔  {name} : à jour")
+                elif dry_run:
+                    status[name] = "built"
+                    print(f"▶  {name} : à reconstruire ({reason})")
+                else:
+                    print(f"▶  {name} : {reason}")
+                    future = executor.submit(lambda t: (time.perf_counter(), t.run(), time.perf_counter()), task)
+                    running[future] = name
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                start, result, end = future.result()
+                if result.returncode == 0:
+                    status[name] = "built"
+                    # Stamp pris après le build : la tâche peut elle-même déplacer des entrées
+                    # (level_data écarte les paires rejetées).
+                    stamps[name] = tasks[name].stamp(tasks)
+                    save_json_cache(stamps_file, stamps)
+                    print(f"✅ {name} ({end - start:.1f} s)")
+                else:
+                    status[name] = "failed"
+                    print(f"❌ {name} (code {result.returncode})")
+                    print("\n".join((result.stdout + result.stderr).strip().splitlines()[-20:]))
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reconstruit les assets générés dont une entrée a changé, tâches indépendantes en parallèle.")
+    parser.add_argument("tasks", nargs="*", metavar="TÂCHE",
+                        help="Tâches à construire avec leurs dépendances (défaut : toutes).")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS,
+                        help="Nombre de tâches lancées en même temps (défaut : nombre de cœurs).")
+    parser.add_argument("--force", action="store_true", help="Reconstruit même les tâches à jour.")
+    parser.add_argument("--dry-run", action="store_true", help="Affiche ce qui serait reconstruit sans rien lancer.")
+    parser.add_argument("--list", action="store_true", help="Liste les tâches, leurs dépendances et leurs sorties.")
+    args = parser.parse_args()
+
+    all_tasks = build_tasks()
+    unknown = [name for name in args.tasks if name not in all_tasks]
+    if unknown:
+        parser.error(f"tâche(s) inconnue(s) : {', '.join(unknown)} (disponibles : {', '.join(all_tasks)})")
+    if args.list:
+        for task in all_tasks.values():
+            deps = f" <- {', '.join(task.deps)}" if task.deps else ""
+            print(f"{task.name}{deps}")
+            for path in task.output_files(all_tasks):
+                print(f"    {repo_relative(path)}")
+        sys.exit(0)
+
+    results = build(args.tasks, jobs=args.jobs, force=args.force, dry_run=args.dry_run)
+    failed = [name for name, state in results.items() if state in ("failed", "skipped")]
+    if failed:
+        print(f"\n❌ Échec : {', '.join(sorted(failed))}")
+        sys.exit(1)
+    rebuilt = sum(1 for state in results.values() if state == "built")
+    if args.dry_run:
+        print(f"\n{rebuilt} tâche(s) à reconstruire.")
+    else:
+        print(f"\n✅ Build terminé ({rebuilt} tâche(s) reconstruite(s)).")
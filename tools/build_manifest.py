@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+
+from asset_utils import (
+    REPO_ROOT,
+    WORK_DIRECTORY,
+    DEBUG_IMAGE_DIRECTORIES,
+    file_digest,
+    is_generated,
+    load_json_cache,
+    save_json_cache,
+    write_file_atomic,
+    repo_relative,
+    remote_url,
+)
+
+# --- CONFIGURATION ---
+# Dossiers décrits par le manifeste (ceux qui n'existent pas sont ignorés)
+MANIFEST_ROOTS = ("images", "data", "optimized")
+# Fichier du manifeste (hors des dossiers décrits, pour ne pas se décrire lui-même)
+MANIFEST_FILE = os.path.join(REPO_ROOT, "asset_manifest.json")
+MANIFEST_VERSION = 1
+# Fichiers qui ne sont pas des assets : scripts et fichiers système
+EXCLUDED_EXTENSIONS = (".py", ".pyc", ".tmp")
+EXCLUDED_DIRECTORIES = ("__pycache__",)
+# Empreintes déjà calculées : chemin -> [mtime_ns, taille, sha256]
+MANIFEST_STAT_CACHE_FILE = os.path.join(WORK_DIRECTORY, "manifest_stat_cache.json")
+
+
+def logical_id(relative_path):
+    """
+    Identifiant stable d'un asset : chemin sans extension, sans le préfixe optimized/
+    (images/oracle/oracle_1.jpg et optimized/images/oracle/oracle_1.webp -> images/oracle/oracle_1).
+    """
+    optimized_prefix = "optimized/"
+    if relative_path.startswith(optimized_prefix):
+        relative_path = relative_path[len(optimized_prefix):]
+    return os.path.splitext(relative_path)[0]
+
+
+def _iter_files(directory):
+    # Parcours récursif par os.scandir (les stat viennent du parcours, sans appel supplémentaire
+    # sur la plupart des systèmes), hors fichiers et dossiers cachés et hors images de débogage.
+    with os.scandir(directory) as entries:
+        for entry in sorted(entries, key=lambda e: e.name):
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in EXCLUDED_DIRECTORIES and not is_generated(entry.path, DEBUG_IMAGE_DIRECTORIES):
+                    yield from _iter_files(entry.path)
+            elif entry.is_file() and not entry.name.endswith(EXCLUDED_EXTENSIONS):
+                yield entry
+
+
+def build_manifest(roots=MANIFEST_ROOTS, cache_file=MANIFEST_STAT_CACHE_FILE):
+    """
+    Manifeste adressé par contenu de tous les assets :
+
+        {"version": 1, "manifestHash": "...",
+         "files": {"images/oracle/oracle_1.jpg": {"id": "images/oracle/oracle_1", "sha256": "...",
+                                                  "bytes": 646112, "url": "https://raw..."}, ...}}
+
+    Incrémental : un fichier dont le mtime et la taille n'ont pas changé depuis la dernière
+    exécution reprend son empreinte du cache, seuls les autres sont relus.
+    manifestHash résume tout le manifeste : deux manifestes de même hash sont identiques.
+    """
+    stat_cache = load_json_cache(cache_file) if cache_file else {}
+    new_cache, files, hashed = {}, {}, 0
+    for root in roots:
+        root_dir = os.path.join(REPO_ROOT, root)
+        if not os.path.isdir(root_dir):
+            continue
+        for entry in _iter_files(root_dir):
+            relative = repo_relative(entry.path)
+            stat = entry.stat()
+            cached = stat_cache.get(relative)
+            if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                digest = cached[2]
+            else:
+                digest = file_digest(entry.path)
+                hashed += 1
+            new_cache[relative] = [stat.st_mtime_ns, stat.st_size, digest]
+            files[relative] = {"id": logical_id(relative), "sha256": digest, "bytes": stat.st_size,
+                               "url": remote_url(entry.path)}
+    if cache_file:
+        save_json_cache(cache_file, new_cache)
+
+    summary = hashlib.sha256()
+    for relative in sorted(files):
+        summary.update(f"{relative}\0{files[relative]['sha256']}\n".encode('utf-8'))
+    manifest = {"version": MANIFEST_VERSION, "manifestHash": summary.hexdigest(), "files": files}
+    return manifest, hashed
+
+
+def diff_manifests(old, new):
+    """
+    Ensemble des changements entre deux manifestes, par chemin :
+    added / removed (chemins triés) et changed (même chemin, contenu différent).
+    moved liste les fichiers ajoutés dont le contenu existait déjà sous un autre chemin
+    supprimé : le client peut les copier localement au lieu de les télécharger.
+    """
+    old_files, new_files = old["files"], new["files"]
+    added = sorted(set(new_files) - set(old_files))
+    removed = sorted(set(old_files) - set(new_files))
+    changed = sorted(path for path in set(old_files) & set(new_files)
+                     if old_files[path]["sha256"] != new_files[path]["sha256"])
+    removed_by_hash = {old_files[path]["sha256"]: path for path in removed}
+    moved = {path: removed_by_hash[new_files[path]["sha256"]] for path in added
+             if new_files[path]["sha256"] in removed_by_hash}
+    return {
+        "from": old.get("manifestHash"),
+        "to": new.get("manifestHash"),
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "moved": moved,
+        "downloadBytes": sum(new_files[path]["bytes"] for path in added + changed if path not in moved),
+    }
+
+
+def _load_manifest(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Construit le manifeste adressé par contenu des assets, ou compare deux manifestes.")
+    parser.add_argument("--output", default=MANIFEST_FILE, help="Fichier du manifeste (défaut : asset_manifest.json).")
+    parser.add_argument("--diff", nargs="+", metavar="MANIFESTE",
+                        help="Compare ANCIEN [NOUVEAU] ; sans NOUVEAU, compare avec l'état actuel des fichiers.")
+    parser.add_argument("--diff-output", metavar="FICHIER", help="Écrit le résultat de --diff en JSON.")
+    parser.add_argument("--no-cache", action="store_true", help="Recalcule toutes les empreintes.")
+    args = parser.parse_args()
+    cache_file = None if args.no_cache else MANIFEST_STAT_CACHE_FILE
+
+    if args.diff:
+        if len(args.diff) > 2:
+            parser.error("--diff attend un ou deux manifestes.")
+        old = _load_manifest(args.diff[0])
+        new = _load_manifest(args.diff[1]) if len(args.diff) == 2 else build_manifest(cache_file=cache_file)[0]
+        changes = diff_manifests(old, new)
+        for label in ("added", "removed", "changed"):
+            for path in changes[label]:
+                print(f"  {label:8} {path}")
+        for path, source in changes["moved"].items():
+            print(f"  moved    {source} -> {path}")
+        print(f"\n{len(changes['added'])} ajoutés, {len(changes['removed'])} supprimés, "
+              f"{len(changes['changed'])} modifiés, {changes['downloadBytes'] / 2 ** 20:.1f} Mo à télécharger.")
+        if args.diff_output:
+            write_file_atomic(args.diff_output, json.dumps(changes, indent=2) + "\n")
+            print(f"✅ Différences exportées : {args.diff_output}")
+    else:
+        start = time.perf_counter()
+        manifest, hashed = build_manifest(cache_file=cache_file)
+        write_file_atomic(args.output, json.dumps(manifest, indent=2, ensure_ascii=False) + "\n")
+        print(f"{len(manifest['files'])} fichiers, {hashed} empreinte(s) recalculée(s) "
+              f"en {time.perf_counter() - start:.2f} s.")
+        print(f"✅ Manifeste exporté : {args.output}")
@@ -0,0 +1,209 @@
+import cv2
+import numpy as np
+import os
+import json
+import argparse
+from collections import defaultdict
+
+from asset_utils import (
+    REPO_ROOT,
+    WORK_DIRECTORY,
+    DATA_ROOT,
+    IMAGE_EXTENSIONS,
+    is_generated,
+    params_digest,
+    load_json_cache,
+    save_json_cache,
+    write_file_atomic,
+    repo_relative,
+)
+from build_manifest import build_manifest
+
+# --- CONFIGURATION ---
+# Index persistant des hashs perceptuels (clé : sha256 du fichier, donc insensible aux renommages)
+PHASH_INDEX_FILE = os.path.join(WORK_DIRECTORY, "phash_index.json")
+# Taille de l'image réduite dont on prend la DCT, et côté du bloc de basses fréquences retenu (8 -> 64 bits)
+PHASH_SAMPLE_SIZE = 32
+PHASH_BLOCK_SIZE = 8
+# Côté minimal (pixels) d'une image indexée : en dessous, la réduction à PHASH_SAMPLE_SIZE
+# agrandit l'image et le hash ne décrit plus que quelques pixels (ex. tuiles de 16 px)
+PHASH_MIN_SIZE = PHASH_SAMPLE_SIZE
+# Distance de Hamming maximale (sur 64 bits) entre deux images considérées comme quasi identiques
+NEAR_DUPLICATE_RADIUS = 6
+# Rapport JSON des doublons
+DUPLICATES_REPORT_FILE = os.path.join(WORK_DIRECTORY, "duplicates_report.json")
+
+
+def perceptual_hash(gray):
+    """
+    pHash 64 bits d'une image en niveaux de gris : DCT de l'image réduite à 32x32, bloc 8x8 des
+    basses fréquences, un bit par coefficient (supérieur à la médiane du bloc, hors composante
+    continue). Résiste au réencodage, au redimensionnement et aux légers changements de couleur.
+    """
+    small = cv2.resize(gray, (PHASH_SAMPLE_SIZE, PHASH_SAMPLE_SIZE), interpolation=cv2.INTER_AREA)
+    block = cv2.dct(small.astype(np.float32))[:PHASH_BLOCK_SIZE, :PHASH_BLOCK_SIZE].flatten()
+    bits = block > np.median(block[1:])
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+class BKTree:
+    """
+    Arbre BK sur la distance de Hamming : chaque nœud range ses enfants par distance à sa
+    propre valeur. Une requête de rayon r ne descend que dans les enfants de distance
+    comprise entre d - r et d + r (inégalité triangulaire), au lieu de comparer tout l'index.
+    """
+
+    def __init__(self):
+        self._root = None
+
+    @staticmethod
+    def distance(a, b):
+        return (a ^ b).bit_count()
+
+    def add(self, value, item):
+        if self._root is None:
+            self._root = (value, [item], {})
+            return
+        node = self._root
+        while True:
+            node_value, items, children = node
+            d = self.distance(value, node_value)
+            if d == 0:
+                items.append(item)
+                return
+            if d not in children:
+                children[d] = (value, [item], {})
+                return
+            node = children[d]
+
+    def query(self, value, radius):
+        """
+        Éléments à distance <= radius de value, sous forme de (distance, item).
+        """
+        results = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node_value, items, children = stack.pop()
+            d = self.distance(value, node_value)
+            if d <= radius:
+                results.extend((d, item) for item in items)
+            for child_distance, child in children.items():
+                if d - radius <= child_distance <= d + radius:
+                    stack.append(child)
+        return results
+
+
+def load_hash_index(index_file=PHASH_INDEX_FILE):
+    """
+    Hash perceptuel de chaque image source de images/, hors sorties générées (is_generated)
+    et hors images de moins de PHASH_MIN_SIZE pixels de côté. Seules les images dont le contenu
+    (sha256, repris du manifeste incrémental) est nouveau sont décodées.
+    Renvoie ({chemin: sha256}, {sha256: phash}).
+    """
+    manifest, _ = build_manifest()
+    images = {path: entry["sha256"] for path, entry in manifest["files"].items()
+              if path.startswith("images/") and os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+              and not is_generated(path)}
+    params_key = params_digest({"sample_size": PHASH_SAMPLE_SIZE, "block_size": PHASH_BLOCK_SIZE,
+                                "min_size": PHASH_MIN_SIZE})
+    cached = load_json_cache(index_file) if index_file else {}
+    entries, hashes = {}, {}
+    for path, digest in images.items():
+        if digest in entries:
+            continue
+        entry = cached.get(digest)
+        if not isinstance(entry, dict) or entry.get("params") != params_key:
+            gray = cv2.imread(os.path.join(REPO_ROOT, path), cv2.IMREAD_GRAYSCALE)
+            if gray is None:
+                print(f"  -> Erreur: Impossible de charger {path}")
+                continue
+            # Trop petite pour un pHash fiable : gardée en cache (sans hash) pour ne pas la relire.
+            value = perceptual_hash(gray) if min(gray.shape) >= PHASH_MIN_SIZE else None
+            entry = {"params": params_key, "phash": None if value is None else f"{value:016x}"}
+        entries[digest] = entry
+        if entry["phash"] is not None:
+            hashes[digest] = int(entry["phash"], 16)
+    if index_file:
+        save_json_cache(index_file, entries)
+    return {path: digest for path, digest in images.items() if digest in hashes}, hashes
+
+
+def _same_level(path, other):
+    # L'originale et la modifiée d'un même niveau sont quasi identiques par construction.
+    return path.replace("_modified", "_original") == other.replace("_modified", "_original")
+
+
+def find_duplicates(images, hashes, radius=NEAR_DUPLICATE_RADIUS):
+    """
+    Doublons exacts (même contenu) et quasi-doublons (pHash à distance <= radius) parmi les images,
+    hors couples originale / modifiée d'un même niveau.
+    """
+    by_digest = defaultdict(list)
+    for path, digest in sorted(images.items()):
+        by_digest[digest].append(path)
+    exact = [paths for paths in by_digest.values() if len(paths) > 1]
+
+    # Un représentant par contenu dans l'arbre : les doublons exacts sont déjà regroupés.
+    tree = BKTree()
+    for digest, paths in by_digest.items():
+        tree.add(hashes[digest], paths[0])
+    near = []
+    representatives = {paths[0]: digest for digest, paths in by_digest.items()}
+    for path, digest in sorted(representatives.items()):
+        for distance, other in tree.query(hashes[digest], radius):
+            if other > path and not _same_level(path, other):
+                near.append({"images": [path, other], "distance": distance})
+    near.sort(key=lambda pair: (pair["distance"], pair["images"]))
+    return exact, near
+
+
+def levels_in_several_catalogs(catalog_dir=os.path.join(DATA_ROOT, "find_the_differences")):
+    """
+    Niveaux (couple image originale / modifiée) présents dans plus d'un catalogue de niveaux.
+    """
+    catalogs_by_level = defaultdict(list)
+    for filename in sorted(os.listdir(catalog_dir)):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(catalog_dir, filename), 'r', encoding='utf-8') as f:
+                levels = json.load(f)
+        except ValueError:
+            continue
+        if not isinstance(levels, list):
+            continue
+        for level in levels:
+            if isinstance(level, dict) and "imageOriginalPath" in level:
+                key = (level["imageOriginalPath"], level.get("imageModifiedPath"))
+                if filename not in catalogs_by_level[key]:
+                    catalogs_by_level[key].append(filename)
+    return [{"imageOriginalPath": original, "imageModifiedPath": modified, "catalogs": catalogs}
+            for (original, modified), catalogs in sorted(catalogs_by_level.items()) if len(catalogs) > 1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Signale les images en double ou quasi identiques et les niveaux présents dans plusieurs catalogues.")
+    parser.add_argument("--radius", type=int, default=NEAR_DUPLICATE_RADIUS,
+                        help=f"Distance de Hamming maximale des quasi-doublons, sur 64 bits (défaut : {NEAR_DUPLICATE_RADIUS}).")
+    parser.add_argument("--report", default=DUPLICATES_REPORT_FILE, help="Fichier JSON du rapport.")
+    args = parser.parse_args()
+
+    images, hashes = load_hash_index()
+    exact, near = find_duplicates(images, hashes, args.radius)
+    shared_levels = levels_in_several_catalogs()
+
+    print(f"{len(images)} images indexées.")
+    print(f"\nDoublons exacts : {len(exact)}")
+    for paths in exact:
+        print("  " + "  =  ".join(paths))
+    print(f"\nQuasi-doublons (distance <= {args.radius}) : {len(near)}")
+    for pair in near:
+        print(f"  [{pair['distance']:2}] {pair['images'][0]}  ~  {pair['images'][1]}")
+    print(f"\nNiveaux présents dans plusieurs catalogues : {len(shared_levels)}")
+    for level in shared_levels:
+        print(f"  {os.path.basename(level['imageOriginalPath'])} : {', '.join(level['catalogs'])}")
+
+    write_file_atomic(args.report, json.dumps({"radius": args.radius, "exact": exact, "near": near,
+                                               "sharedLevels": shared_levels}, indent=2) + "\n")
+    print(f"\n✅ Rapport exporté : {repo_relative(args.report)}")
@@ -0,0 +1,249 @@
+import cv2
+import numpy as np
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from asset_utils import (
+    REPO_ROOT,
+    WORK_DIRECTORY,
+    REMOTE_BASE_URL,
+    IMAGE_EXTENSIONS,
+    file_digest,
+    params_digest,
+    load_json_cache,
+    save_json_cache,
+    write_file_atomic,
+    repo_relative,
+    remote_url,
+    iter_catalogs,
+    init_worker,
+)
+from optimize_assets import OPTIMIZED_ROOT, TARGET_EXTENSION, QUALITY_FLOORS, FIDELITY_SCORING, search_quality
+
+# --- CONFIGURATION ---
+# Largeurs des variantes (seules celles inférieures à la largeur de la source sont produites)
+VARIANT_WIDTHS = (150, 300, 600)
+# Plancher SSIM des variantes (même recherche de qualité que optimize_assets.py)
+VARIANT_SSIM_FLOOR = QUALITY_FLOORS["ssim"]
+# Nombre de composantes (horizontales, verticales) du blurhash : ~28 caractères en 4x3
+BLURHASH_COMPONENTS = (4, 3)
+# Largeur de l'aperçu sur lequel le blurhash est calculé (le résultat n'en dépend presque pas)
+BLURHASH_SAMPLE_WIDTH = 32
+# Suffixe des catalogues enrichis (remote_puzzles_1.json -> remote_puzzles_1_variants.json)
+VARIANTS_CATALOG_SUFFIX = "_variants.json"
+VARIANTS_CATALOG_VERSION = 1
+# Cache des variantes (clé : contenu de la source + paramètres)
+VARIANTS_CACHE_FILE = os.path.join(WORK_DIRECTORY, "variants_cache.json")
+
+BASE83_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _base83(value, length):
+    return "".join(BASE83_ALPHABET[(value // 83 ** (length - 1 - i)) % 83] for i in range(length))
+
+
+def _srgb_to_linear(values):
+    values = values / 255.0
+    return np.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(value):
+    value = min(1.0, max(0.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def blurhash(image, components=BLURHASH_COMPONENTS):
+    """
+    Placeholder BlurHash (https://blurha.sh) d'une image BGR : quelques coefficients
+    de cosinus encodés en base 83, décodables par les bibliothèques blurhash côté client.
+    """
+    x_components, y_components = components
+    hauteur, largeur = image.shape[:2]
+    sample_height = max(1, round(BLURHASH_SAMPLE_WIDTH * hauteur / largeur))
+    small = cv2.resize(image[:, :, :3], (BLURHASH_SAMPLE_WIDTH, sample_height), interpolation=cv2.INTER_AREA)
+    linear = _srgb_to_linear(small[:, :, ::-1].astype(np.float64))
+    h, w = linear.shape[:2]
+
+    cos_x = np.cos(np.pi * np.outer(np.arange(x_components), np.arange(w)) / w)
+    cos_y = np.cos(np.pi * np.outer(np.arange(y_components), np.arange(h)) / h)
+    # factors[j, i] = moyenne pondérée de chaque canal par cos_y[j] x cos_x[i]
+    factors = np.einsum('jy,ix,yxc->jic', cos_y, cos_x, linear) / (w * h)
+    factors[1:, :] *= 2
+    factors[0, 1:] *= 2
+    factors = factors.reshape(-1, 3)
+    dc, ac = factors[0], factors[1:]
+
+    result = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if len(ac):
+        quantised_maximum = int(max(0, min(82, np.floor(np.abs(ac).max() * 166 - 0.5))))
+        maximum = (quantised_maximum + 1) / 166
+        result += _base83(quantised_maximum, 1)
+    else:
+        maximum = 1.0
+        result += _base83(0, 1)
+    r, g, b = (_linear_to_srgb(c) for c in dc)
+    result += _base83((r << 16) + (g << 8) + b, 4)
+    for factor in ac:
+        quantised = [int(max(0, min(18, np.floor(np.sign(c) * abs(c / maximum) ** 0.5 * 9 + 9.5)))) for c in factor]
+        result += _base83(quantised[0] * 19 * 19 + quantised[1] * 19 + quantised[2], 2)
+    return result
+
+
+def variant_path(source_path, width):
+    base = os.path.splitext(os.path.join(OPTIMIZED_ROOT, repo_relative(source_path)))[0]
+    return f"{base}_{width}w{TARGET_EXTENSION}"
+
+
+def build_variants(source_path):
+    """
+    Produit (dans un processus de travail) les variantes d'une image et renvoie sa description :
+    dimensions, taille, blurhash et, par largeur, le fichier WebP écrit sous OPTIMIZED_ROOT.
+    """
+    image = cv2.imread(source_path, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    hauteur, largeur = image.shape[:2]
+    description = {
+        "width": largeur,
+        "height": hauteur,
+        "bytes": os.path.getsize(source_path),
+        "blurhash": blurhash(image),
+        "variants": [],
+    }
+    for width in VARIANT_WIDTHS:
+        if width >= largeur:
+            continue
+        height = max(1, round(hauteur * width / largeur))
+        resized = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+        found = search_quality(resized, "ssim", VARIANT_SSIM_FLOOR)
+        if found is None:
+            continue
+        _, _, data = found
+        output_path = variant_path(source_path, width)
+        write_file_atomic(output_path, data)
+        description["variants"].append({"width": width, "height": height, "bytes": len(data),
+                                        "file": repo_relative(output_path)})
+    return description
+
+
+def _catalog_urls(node):
+    # URL d'images du dépôt présentes dans un catalogue, dans l'ordre du fichier.
+    if isinstance(node, dict):
+        for value in node.values():
+            yield from _catalog_urls(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _catalog_urls(value)
+    elif isinstance(node, str) and node.startswith(REMOTE_BASE_URL):
+        yield node
+
+
+def source_for_url(url):
+    """
+    Image source du dépôt servie par url ; pour une version optimisée
+    (optimized/images/x.webp), renvoie l'original images/x.* afin d'éviter une double compression.
+    """
+    relative = url[len(REMOTE_BASE_URL):]
+    optimized_prefix = repo_relative(OPTIMIZED_ROOT) + "/"
+    if relative.startswith(optimized_prefix):
+        stem = os.path.splitext(os.path.join(REPO_ROOT, relative[len(optimized_prefix):]))[0]
+        for extension in IMAGE_EXTENSIONS + tuple(e.upper() for e in IMAGE_EXTENSIONS):
+            if os.path.exists(stem + extension):
+                return stem + extension
+        return None
+    path = os.path.join(REPO_ROOT, relative)
+    return path if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS and os.path.exists(path) else None
+
+
+def generate_variants(jobs=None, cache_file=VARIANTS_CACHE_FILE):
+    """
+    Pour chaque catalogue de data/ qui référence des images du dépôt, écrit à côté un
+    <catalogue>_variants.json (le catalogue d'origine n'est pas modifié) :
+
+        {"version": 1, "images": [{"url": ..., "width": 900, "height": 1200, "bytes": 512345,
+                                   "blurhash": "LEHV6nWB2yk8pyo0adR*.7kCMdnj",
+                                   "variants": [{"width": 150, "height": 200, "bytes": 4321, "url": ...}, ...]},
+                                  ...]}
+
+    "url" est l'URL telle qu'elle figure dans le catalogue (clé de jointure pour le client).
+    """
+    params = {"widths": list(VARIANT_WIDTHS), "floor": VARIANT_SSIM_FLOOR, "scoring": FIDELITY_SCORING,
+              "components": list(BLURHASH_COMPONENTS), "codec": TARGET_EXTENSION}
+    params_key = params_digest(params)
+
+    catalogs = []
+    for catalog in iter_catalogs():
+        if catalog.endswith(VARIANTS_CATALOG_SUFFIX):
+            continue
+        with open(catalog, 'r', encoding='utf-8') as f:
+            urls = list(dict.fromkeys(_catalog_urls(json.load(f))))
+        urls = [(url, source_for_url(url)) for url in urls]
+        urls = [(url, source) for url, source in urls if source]
+        if urls:
+            catalogs.append((catalog, urls))
+
+    sources = sorted({source for _, urls in catalogs for _, source in urls})
+    cache = load_json_cache(cache_file) if cache_file else {}
+    descriptions, misses = {}, []
+    for source_path in sources:
+        key = repo_relative(source_path)
+        digest = file_digest(source_path)
+        entry = cache.get(key)
+        if (entry and entry["digest"] == digest and entry["params"] == params_key
+                and all(os.path.exists(os.path.join(REPO_ROOT, v["file"])) for v in entry["description"]["variants"])):
+            descriptions[source_path] = entry["description"]
+        else:
+            misses.append((source_path, key, digest))
+    print(f"{len(sources)} images référencées, {len(misses)} à traiter.")
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(misses) > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as executor:
+            computed = list(executor.map(build_variants, [source for source, _, _ in misses]))
+    else:
+        computed = [build_variants(source) for source, _, _ in misses]
+    for (source_path, key, digest), description in zip(misses, computed):
+        if description is None:
+            print(f"  -> Erreur: Impossible de charger {key}")
+            continue
+        descriptions[source_path] = description
+        cache[key] = {"digest": digest, "params": params_key, "description": description}
+        print(f"  -> {key} : {len(description['variants'])} variante(s), {description['blurhash']}")
+    if cache_file:
+        save_json_cache(cache_file, {key: entry for key, entry in cache.items()
+                                     if os.path.exists(os.path.join(REPO_ROOT, key))})
+
+    for catalog, urls in catalogs:
+        images = []
+        for url, source_path in urls:
+            if source_path not in descriptions:
+                continue
+            description = descriptions[source_path]
+            images.append({
+                "url": url,
+                "width": description["width"],
+                "height": description["height"],
+                "bytes": description["bytes"],
+                "blurhash": description["blurhash"],
+                "variants": [{key: value for key, value in variant.items() if key != "file"}
+                             | {"url": remote_url(os.path.join(REPO_ROOT, variant["file"]))}
+                             for variant in description["variants"]],
+            })
+        output_path = os.path.splitext(catalog)[0] + VARIANTS_CATALOG_SUFFIX
+        write_file_atomic(output_path, json.dumps({"version": VARIANTS_CATALOG_VERSION, "images": images},
+                                                  indent=2, ensure_ascii=False) + "\n")
+        print(f"Catalogue enrichi : {repo_relative(output_path)} ({len(images)} images)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Produit des variantes de largeur et un blurhash par image, et les catalogues *_variants.json.")
+    parser.add_argument("--jobs", type=int, help="Nombre de processus (défaut : nombre de cœurs).")
+    parser.add_argument("--no-cache", action="store_true", help="Régénère toutes les variantes.")
+    args = parser.parse_args()
+    generate_variants(jobs=args.jobs, cache_file=None if args.no_cache else VARIANTS_CACHE_FILE)
+    print("\n✅ Variantes générées.")
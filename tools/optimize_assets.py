@@ -0,0 +1,206 @@
+import cv2
+import numpy as np
+from skimage.metrics import structural_similarity as ssim
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from asset_utils import (
+    REPO_ROOT,
+    WORK_DIRECTORY,
+    ASSET_DIRECTORIES,
+    file_digest,
+    params_digest,
+    load_json_cache,
+    save_json_cache,
+    write_file_atomic,
+    repo_relative,
+    remote_url,
+    iter_images,
+    rewrite_catalog_urls,
+    init_worker,
+)
+
+# --- CONFIGURATION ---
+# Les versions optimisées reprennent l'arborescence du dépôt sous ce dossier
+# (images/puzzle_game/puzzle1.jpg -> optimized/images/puzzle_game/puzzle1.webp)
+OPTIMIZED_ROOT = os.path.join(REPO_ROOT, "optimized")
+# Format cible et bornes de la recherche de qualité
+TARGET_EXTENSION = ".webp"
+MIN_QUALITY = 30
+MAX_QUALITY = 95
+# Plancher de fidélité par métrique, mesurée par rapport à la source sur le canal B, G ou R le
+# plus dégradé : le WebP avec perte sous-échantillonne la chrominance (4:2:0), perte que la
+# luminance seule ne voit pas. À 0.985, les images lisses (oracle/) se répartissent entre les
+# qualités 30 et 80 au lieu de toutes tomber sur MIN_QUALITY.
+QUALITY_FLOORS = {"ssim": 0.985, "psnr": 38.0}
+# Version du calcul de fidélité (entre dans la clé des caches)
+FIDELITY_SCORING = "min_channel"
+# Cache des résultats (clé : contenu de la source + paramètres de recherche)
+TRANSCODE_CACHE_FILE = os.path.join(WORK_DIRECTORY, "optimize_assets_cache.json")
+
+
+def optimized_path(source_path):
+    return os.path.splitext(os.path.join(OPTIMIZED_ROOT, repo_relative(source_path)))[0] + TARGET_EXTENSION
+
+
+def _channels(image, count):
+    # Canaux comparés : la luminance pour une source en niveaux de gris, sinon B, G et R (sans l'alpha).
+    if count == 1:
+        return [image if image.ndim == 2 else cv2.cvtColor(image[:, :, :3], cv2.COLOR_BGR2GRAY)]
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    return cv2.split(image[:, :, :3])
+
+
+def fidelity(reference_channels, image, metric):
+    """
+    Score du canal le plus dégradé de image par rapport aux canaux de la source.
+    """
+    candidate = _channels(image, len(reference_channels))
+    if metric == "ssim":
+        return min(float(ssim(ref, cand)) for ref, cand in zip(reference_channels, candidate))
+    return min(float(cv2.PSNR(ref, cand)) for ref, cand in zip(reference_channels, candidate))
+
+
+def search_quality(image, metric, floor, min_quality=MIN_QUALITY, max_quality=MAX_QUALITY):
+    """
+    Recherche dichotomique de la plus petite qualité WebP dont le décodage atteint le plancher
+    de fidélité (la fidélité croît avec la qualité). Renvoie (qualité, score, octets encodés),
+    ou None si même max_quality n'atteint pas le plancher.
+    """
+    reference_channels = _channels(image, 1 if image.ndim == 2 else 3)
+    encoded = {}
+
+    def trial(quality):
+        if quality not in encoded:
+            data = cv2.imencode(TARGET_EXTENSION, image, [cv2.IMWRITE_WEBP_QUALITY, quality])[1].tobytes()
+            decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+            encoded[quality] = (fidelity(reference_channels, decoded, metric), data)
+        return encoded[quality]
+
+    if trial(max_quality)[0] < floor:
+        return None
+    low, high = min_quality, max_quality
+    while low < high:
+        middle = (low + high) // 2
+        if trial(middle)[0] >= floor:
+            high = middle
+        else:
+            low = middle + 1
+    score, data = trial(high)
+    return high, score, data
+
+
+def transcode_image(job):
+    """
+    Traite une image (dans un processus de travail) : écrit sa version WebP si elle atteint
+    le plancher et pèse moins que la source. Renvoie le résultat à mettre en cache.
+    """
+    source_path, metric, floor = job
+    image = cv2.imread(source_path, cv2.IMREAD_UNCHANGED)
+    source_bytes = os.path.getsize(source_path)
+    result = {"status": "kept", "bytes_in": source_bytes, "bytes_out": source_bytes}
+    if image is None:
+        result["status"] = "unreadable"
+        return result
+    if image.dtype != np.uint8:
+        image = cv2.convertScaleAbs(image, alpha=255.0 / np.iinfo(image.dtype).max)
+
+    found = search_quality(image, metric, floor)
+    if found is None:
+        return result
+    quality, score, data = found
+    result.update(quality=quality, score=round(score, 4))
+    if len(data) >= source_bytes:
+        return result
+
+    output_path = optimized_path(source_path)
+    write_file_atomic(output_path, data)
+    result.update(status="transcoded", bytes_out=len(data), output=repo_relative(output_path))
+    return result
+
+
+def optimize_assets(directories=ASSET_DIRECTORIES, metric="ssim", floor=None, jobs=None,
+                    cache_file=TRANSCODE_CACHE_FILE, rewrite_catalogs=True):
+    """
+    Transcode toutes les images des dossiers en WebP à la plus petite qualité respectant le
+    plancher, en parallèle (jobs processus), en sautant les sources inchangées depuis la
+    dernière exécution, puis fait pointer les URL des catalogues vers les versions optimisées.
+    """
+    floor = QUALITY_FLOORS[metric] if floor is None else floor
+    params = {"metric": metric, "floor": floor, "scoring": FIDELITY_SCORING, "codec": TARGET_EXTENSION,
+              "min_quality": MIN_QUALITY, "max_quality": MAX_QUALITY}
+    params_key = params_digest(params)
+
+    sources = list(iter_images(directories))
+    cache = load_json_cache(cache_file) if cache_file else {}
+    results, misses = {}, []
+    for source_path in sources:
+        key = repo_relative(source_path)
+        digest = file_digest(source_path)
+        entry = cache.get(key)
+        if (entry and entry["digest"] == digest and entry["params"] == params_key
+                and (entry["result"]["status"] != "transcoded"
+                     or os.path.exists(os.path.join(REPO_ROOT, entry["result"]["output"])))):
+            results[key] = entry["result"]
+        else:
+            misses.append((source_path, key, digest))
+    print(f"{len(sources)} images, {len(sources) - len(misses)} inchangées (cache), {len(misses)} à traiter.")
+
+    jobs = jobs or os.cpu_count() or 1
+    job_args = [(source_path, metric, floor) for source_path, _, _ in misses]
+    if jobs > 1 and len(misses) > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as executor:
+            computed = list(executor.map(transcode_image, job_args))
+    else:
+        computed = [transcode_image(job) for job in job_args]
+
+    for (_, key, digest), result in zip(misses, computed):
+        results[key] = result
+        cache[key] = {"digest": digest, "params": params_key, "result": result}
+        if result["status"] == "transcoded":
+            print(f"  -> {key} : qualité {result['quality']} ({metric} {result['score']}), "
+                  f"{result['bytes_in'] / 1024:.0f} Ko -> {result['bytes_out'] / 1024:.0f} Ko")
+        else:
+            print(f"  -> {key} : source conservée ({result['status']})")
+    if cache_file:
+        # On garde les entrées des autres dossiers (exécution partielle), pas celles des sources supprimées.
+        save_json_cache(cache_file, {key: entry for key, entry in cache.items()
+                                     if os.path.exists(os.path.join(REPO_ROOT, key))})
+
+    bytes_in = sum(r["bytes_in"] for r in results.values())
+    bytes_out = sum(r["bytes_out"] for r in results.values())
+    print(f"\nTotal : {bytes_in / 2 ** 20:.1f} Mo -> {bytes_out / 2 ** 20:.1f} Mo")
+
+    if rewrite_catalogs:
+        url_mapping = {
+            remote_url(os.path.join(REPO_ROOT, key)): remote_url(os.path.join(REPO_ROOT, result["output"]))
+            for key, result in results.items() if result["status"] == "transcoded"
+        }
+        for catalog, count in rewrite_catalog_urls(url_mapping).items():
+            print(f"Catalogue mis à jour : {repo_relative(catalog)} ({count} URL)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Transcode les images servies en WebP à la plus petite qualité respectant un plancher SSIM/PSNR.")
+    parser.add_argument("directories", nargs="*", default=list(ASSET_DIRECTORIES),
+                        help="Dossiers de images/ à traiter (défaut : tous les dossiers servis).")
+    parser.add_argument("--metric", choices=sorted(QUALITY_FLOORS), default="ssim",
+                        help="Métrique de fidélité (défaut : ssim).")
+    parser.add_argument("--floor", type=float,
+                        help=f"Plancher de la métrique sur le canal le plus dégradé (défaut : "
+                             f"{QUALITY_FLOORS['ssim']} en SSIM, {QUALITY_FLOORS['psnr']:g} dB en PSNR).")
+    parser.add_argument("--jobs", type=int,
+                        help="Nombre de processus (défaut : nombre de cœurs).")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Retraite toutes les images, même inchangées.")
+    parser.add_argument("--no-rewrite", action="store_true",
+                        help="Ne modifie pas les URL des catalogues de data/.")
+    args = parser.parse_args()
+    optimize_assets(args.directories, metric=args.metric, floor=args.floor, jobs=args.jobs,
+                    cache_file=None if args.no_cache else TRANSCODE_CACHE_FILE,
+                    rewrite_catalogs=not args.no_rewrite)
+    print("\n✅ Optimisation terminée.")